@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@File: build_runner.py
+@Description:
+  Maven runners shared by find_covered_log_statement.py and get_logs_output/execute_unittest.py.
+  1. mvn: a fresh Maven JVM for every invocation
+  2. mvnd: Maven Daemon (https://github.com/apache/maven-mvnd). Builds are submitted to warm daemons that keep
+     the JVM, the loaded plugins and their JIT state between runs; an idle daemon is reused, so with N worker
+     threads up to N daemons stay warm. A build whose daemon dies is run again with plain mvn. Every runner keeps
+     its daemons in a daemon storage of its own, so closing it stops only the daemons it started.
+  3. auto: mvnd when it is on the PATH, otherwise mvn
+  With a dependency cache filled by prefetch_dependencies.py, every build can run offline (-o). The cache is used
+  read-only as the tail of Maven's chained local repository (-Dmaven.repo.local.tail, which needs Maven 3.9 or
+  newer; older versions ignore it and fail to resolve offline), so builds keep installing their own artifacts into
+  the usual writable local repository and the shared cache is never modified.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+RUNNER_BACKENDS = ['auto', 'mvnd', 'mvn']
+
+# Messages of mvnd when the daemon, not the build, failed
+MVND_DAEMON_ERRORS = ['DaemonException', 'Could not connect to daemon', 'daemon crashed', 'Daemon terminated']
+
+
+class BuildRunner(ABC):
+    """
+    Runs Maven goals in a project directory. Backends implement run, and close if they hold resources.
+
+    offline: no remote repository is contacted (-o)
+    dependency_cache: local repository with the pre-resolved dependencies, read-only unless read_only_cache is False,
+    in which case it becomes the local repository itself (used by the prefetch stage to fill it)
+    """
+    name = ''
+
+    def __init__(self, logger: Optional[logging.Logger] = None, offline: bool = False, dependency_cache: Optional[str] = None, read_only_cache: bool = True):
+        self.logger = logger or logging.getLogger(__name__)
+        self.offline = offline
+        self.dependency_cache = dependency_cache
+        self.read_only_cache = read_only_cache
+
+    def options(self) -> List[str]:
+        """Maven options of every build of this runner"""
+        options = ['-o'] if self.offline else []
+        if self.dependency_cache:
+            if self.read_only_cache:
+                options.append(f"-Dmaven.repo.local.tail={self.dependency_cache}")
+            else:
+                options.append(f"-Dmaven.repo.local={self.dependency_cache}")
+        return options
+
+    @abstractmethod
+    def run(self, goals: List[str], cwd: str, check: bool = False) -> subprocess.CompletedProcess:
+        """Run the goals in cwd, capturing stdout and stderr as text. With check, a failed build raises CalledProcessError."""
+
+    def close(self) -> None:
+        pass
+
+
+class MvnRunner(BuildRunner):
+    """A fresh Maven JVM per build, like subprocess.run(['mvn'] + goals, cwd=cwd)."""
+    name = 'mvn'
+    executable = 'mvn'
+
+    def command(self, goals: List[str]) -> List[str]:
+        return [self.executable] + self.options() + goals
+
+    def run(self, goals: List[str], cwd: str, check: bool = False) -> subprocess.CompletedProcess:
+        return subprocess.run(self.command(goals), check=check, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              text=True, cwd=cwd)
+
+
+class MvndRunner(MvnRunner):
+    """
+    Builds submitted to warm Maven Daemons, a build whose daemon fails is repeated with mvn. The daemons are registered
+    in a temporary daemon storage of this runner, other mvnd users on the host neither share nor see them.
+    """
+    name = 'mvnd'
+    executable = 'mvnd'
+
+    def __init__(self, logger: Optional[logging.Logger] = None, offline: bool = False, dependency_cache: Optional[str] = None, read_only_cache: bool = True):
+        super().__init__(logger, offline, dependency_cache, read_only_cache)
+        self.fallback = MvnRunner(logger, offline, dependency_cache, read_only_cache)
+        self.daemon_storage = tempfile.mkdtemp(prefix='mvnd-')
+
+    def daemon_options(self) -> List[str]:
+        return [f"-Dmvnd.daemonStorage={self.daemon_storage}"]
+
+    def command(self, goals: List[str]) -> List[str]:
+        # Plain console output, the same as mvn -B, so the logs can be read the same way
+        return [self.executable, '-B', '--raw-streams'] + self.daemon_options() + self.options() + goals
+
+    def run(self, goals: List[str], cwd: str, check: bool = False) -> subprocess.CompletedProcess:
+        result = subprocess.run(self.command(goals), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=cwd)
+        if result.returncode != 0 and any(error in result.stdout + result.stderr for error in MVND_DAEMON_ERRORS):
+            self.logger.warning(f"Maven daemon failed in {cwd}, running {' '.join(goals)} with mvn")
+            return self.fallback.run(goals, cwd, check)
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+        return result
+
+    def close(self) -> None:
+        """Stop the daemons of this runner's daemon storage and remove it, daemons of other storages keep running."""
+        subprocess.run([self.executable] + self.daemon_options() + ['--stop'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        shutil.rmtree(self.daemon_storage, ignore_errors=True)
+
+
+def create_runner(backend: str = 'auto', logger: Optional[logging.Logger] = None, offline: bool = False, dependency_cache: Optional[str] = None, read_only_cache: bool = True) -> BuildRunner:
+    """Runner of the backend, plain mvn when mvnd is not installed"""
+    if backend not in RUNNER_BACKENDS:
+        raise ValueError(f"Unknown build runner '{backend}', expected one of {RUNNER_BACKENDS}")
+    if backend in ('auto', 'mvnd') and shutil.which('mvnd') is not None:
+        return MvndRunner(logger, offline, dependency_cache, read_only_cache)
+    if backend == 'mvnd' and logger is not None:
+        logger.warning("mvnd not found on PATH, falling back to mvn")
+    return MvnRunner(logger, offline, dependency_cache, read_only_cache)
+
+
+# One runner per process, chosen by the entry script with configure_runner
+_runner: BuildRunner = MvnRunner()
+
+
+def configure_runner(backend: str = 'auto', logger: Optional[logging.Logger] = None, dependency_cache: Optional[str] = None) -> BuildRunner:
+    """Set the runner of this process. With a dependency_cache, all builds run offline against it."""
+    global _runner
+    if dependency_cache is not None:
+        # Builds run in other directories, the path must not be relative
+        dependency_cache = os.path.abspath(dependency_cache)
+    _runner = create_runner(backend, logger, offline=dependency_cache is not None, dependency_cache=dependency_cache)
+    if logger is not None:
+        logger.info(f"Build runner: {_runner.name} {' '.join(_runner.options())}".rstrip())
+    return _runner
+
+
+def get_runner() -> BuildRunner:
+    return _runner
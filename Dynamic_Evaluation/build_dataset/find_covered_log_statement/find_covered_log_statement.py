@@ -16,6 +16,11 @@ from extract_covered_log_statement import extract_covered_logs
 # Multi-thread version
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from build_runner import RUNNER_BACKENDS, configure_runner, get_runner
+from prefetch_dependencies import prefetch_dependencies
 
 def load_projects(json_path: str) -> List[Dict[str, Any]]:
     """load data from json file"""
@@ -57,16 +62,15 @@ def run_tests(project_dir: str, hadoop_root: str, test_list: List[str], logger:
                         continue
             if index == 0:
                 # 先构建项目
-                cmd = f"mvn clean install -DskipTests"
-                result = subprocess.run(cmd, shell=True, cwd=project_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                result = get_runner().run(["clean", "install", "-DskipTests"], cwd=project_dir)
                 if result.returncode != 0:
                     logger.error(f"Build project failed: {project_dir}")
                     # 写入 jsonl 记录
                     write_test_result(execution_result_save_dir, project_dir, 'all', 0, False, result_file_lock)
                     return False
 
-            cmd = f"mvn test -Dtest={test_name}"
-            logger.info(f"Running Test: {test_name} in {cmd}")
+            goals = ["test", f"-Dtest={test_name}"]
+            logger.info(f"Running Test: {test_name} in {get_runner().name} {' '.join(goals)}")
             target_dir = os.path.join(project_dir, "target/site/jacoco")
             surefire_dir = os.path.join(project_dir, "target/surefire-reports")
 
@@ -77,14 +81,7 @@ def run_tests(project_dir: str, hadoop_root: str, test_list: List[str], logger:
             start_time = time.time()
 
             # Execute command and capture output
-            subprocess.run(
-                cmd,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=project_dir
-            )
+            get_runner().run(goals, cwd=project_dir)
 
             if not os.path.exists(target_dir) or not os.path.exists(surefire_dir):
                 logger.warning(f"{test_name} has no jacoco or surefire-reports")
@@ -227,6 +224,12 @@ def main():
                     help='Data save directory, please use absolute path in Docker')
     parser.add_argument('--use-cache', choices=['yes', 'no'], required=True,
                       help='Start from cache')
+    parser.add_argument('--build-runner', choices=RUNNER_BACKENDS, default='auto',
+                      help='mvn starts a JVM per test run, mvnd submits the runs to warm Maven daemons (auto: mvnd if installed)')
+    parser.add_argument('--dependency-cache', type=str, default=None,
+                      help='Pre-resolved local repository, all builds run offline against it (read-only, needs Maven 3.9+)')
+    parser.add_argument('--prefetch', action='store_true',
+                      help='Fill --dependency-cache for the projects of --potential-dir before running the tests')
 
     args = parser.parse_args()
 
@@ -267,8 +270,18 @@ def main():
             unfinished_projects = exclude_build_failed_from_catch_projects(execution_result_save_dir, projects)
             projects = unfinished_projects
 
+        if args.prefetch:
+            if args.dependency_cache is None:
+                raise ValueError("--prefetch needs --dependency-cache")
+            logger.info(f"==========Prefetching dependencies into {args.dependency_cache}==========")
+            prefetch_dependencies(projects, code_root, args.dependency_cache, logger, args.build_runner)
+
         # Process projects
-        process_projects(projects, code_root, logger, target_save_dir, num_thread, execution_result_save_dir, use_cache)
+        runner = configure_runner(args.build_runner, logger, args.dependency_cache)
+        try:
+            process_projects(projects, code_root, logger, target_save_dir, num_thread, execution_result_save_dir, use_cache)
+        finally:
+            runner.close()
         logger.info("Test execution process completed")
 
         # 第二步：提取被覆盖的日志语句
@@ -13,12 +13,14 @@
 """
 
 import os
+import re
 import json
 import logging
 import subprocess
 from pathlib import Path
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Optional
 from tool import setup_logging, replace_func, reverse_func, read_jsonl, read_json
+from sandbox import ModuleSandbox, SANDBOX_METHODS
 import argparse
 import shutil
 import time
@@ -26,6 +28,9 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from build_runner import RUNNER_BACKENDS, configure_runner, get_runner
+
 
 def load_catch_point(results_data: List[Dict], uuid: str) -> bool:
     for item in results_data:
@@ -50,17 +55,82 @@ def save_result(execute_success: bool, execute_time: float, label_file_size: flo
         write_lock.release()
 
 
-def run_maven_test(test_name: str, mvn_dir: str, logger: logging.Logger, record_error: bool, record_error_path: str, uuid: str) -> bool:
+# Source roots of a Maven module and the directories their classes are compiled to
+CLASS_OUTPUT_DIRS = {'/src/main/java/': 'target/classes', '/src/test/java/': 'target/test-classes'}
+# Every labeled function carries the tag as a string literal, so it is in the constant pool of its class
+CLASS_TAG_PROBE = b'[SUPER TAG'
+
+
+def class_files_of(source_path: str) -> Optional[List[str]]:
+    """
+    Compiled class files of a Java source file (the top-level class and its nested and anonymous classes),
+    None when the file is not under a standard Maven source root.
+    """
+    source_path = os.path.abspath(source_path)
+    for source_root, output_dir in CLASS_OUTPUT_DIRS.items():
+        if source_root in source_path and source_path.endswith('.java'):
+            module_dir, relative_path = source_path.split(source_root, 1)
+            class_path = os.path.join(module_dir, output_dir, relative_path[:-len('.java')])
+            class_dir, class_name = os.path.split(class_path)
+            if not os.path.isdir(class_dir):
+                return []
+            return [os.path.join(class_dir, f) for f in os.listdir(class_dir)
+                    if f == f"{class_name}.class" or (f.startswith(f"{class_name}$") and f.endswith('.class'))]
+    return None
+
+def invalidate_classes(source_paths: List[str], logger: logging.Logger) -> bool:
+    """Delete the compiled classes of the edited files, so the next build has to recompile them. False if a file cannot be mapped to its classes."""
+    for source_path in source_paths:
+        class_files = class_files_of(source_path)
+        if class_files is None:
+            logger.warning(f"Cannot locate compiled classes of {source_path}")
+            return False
+        for class_file in class_files:
+            os.remove(class_file)
+    return True
+
+def verify_compiled(source_paths: List[str], since: float, logger: logging.Logger) -> bool:
+    """Check that every edited file was compiled again after since and that its classes contain the tag probe."""
+    for source_path in source_paths:
+        class_files = class_files_of(source_path) or []
+        fresh = [class_file for class_file in class_files if os.path.getmtime(class_file) >= since]
+        if not fresh or len(fresh) != len(class_files):
+            logger.warning(f"Classes of {source_path} were not recompiled")
+            return False
+        if not any(CLASS_TAG_PROBE in Path(class_file).read_bytes() for class_file in fresh):
+            logger.warning(f"Classes of {source_path} do not contain the labeled statements")
+            return False
+    return True
+
+def run_maven_test(test_name: str, mvn_dir: str, logger: logging.Logger, record_error: bool, record_error_path: str, uuid: str, incremental: bool = False, edited_files: Optional[List[str]] = None) -> bool:
+    """
+    mvn clean test -Dtest={test_name}
+
+    In incremental mode clean is skipped: only the classes of edited_files are deleted and recompiled, the rest of
+    the module's build output is reused. The recompiled classes are verified afterwards (newer than the run and
+    containing the tag probe); if they are not, the run is repeated with clean, so stale bytecode cannot be tested.
+    A failed incremental run is also repeated once with clean, since stale build output can break it as well, and
+    only the result of the clean run is reported.
+    """
+    if incremental:
+        edited_files = edited_files or []
+        surefire_dir = os.path.join(mvn_dir, "target/surefire-reports")
+        reason = "cannot be trusted"
+        if invalidate_classes(edited_files, logger):
+            shutil.rmtree(surefire_dir, ignore_errors=True)
+            start_time = time.time()
+            # With useIncrementalCompilation=false the compiler plugin recompiles only stale sources instead of the whole module
+            goals = ["test", "-Dmaven.compiler.useIncrementalCompilation=false", f"-Dtest={test_name}"]
+            if not _run_maven_command(goals, test_name, mvn_dir, logger, record_error, record_error_path, uuid):
+                reason = "failed"
+            elif verify_compiled(edited_files, start_time, logger):
+                return True
+        logger.warning(f"Incremental build of {mvn_dir} {reason}, running {test_name} again with clean")
+    return _run_maven_command(["clean", "test", f"-Dtest={test_name}"], test_name, mvn_dir, logger, record_error, record_error_path, uuid)
+
+def _run_maven_command(goals: List[str], test_name: str, mvn_dir: str, logger: logging.Logger, record_error: bool, record_error_path: str, uuid: str) -> bool:
     try:
-        command = ["mvn", "clean", "test", f"-Dtest={test_name}"]
-        result = subprocess.run(
-            command,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=mvn_dir
-        )
+        get_runner().run(goals, cwd=mvn_dir, check=True)
         return True
     except subprocess.CalledProcessError as e:
         logger.error(f"Failed to run test: {test_name}")
@@ -81,88 +151,144 @@ def run_maven_test(test_name: str, mvn_dir: str, logger: logging.Logger, record_
         logger.error(f"Unexpected error occurred while running test {test_name}: {str(e)}")
         return False
 
-def execute_unittest(json_data: List[Dict], replace_data_path: str, results_dir: str, logger: logging.Logger, use_catch_point: bool, record_error: bool, record_error_path: str, write_lock: threading.Lock = None) -> None:
+SUPER_TAG = '[SUPER TAG]'
+BATCH_TAG_PATTERN = re.compile(r'\[SUPER TAG:[^\]]*\]')
+
+
+def batch_super_tag(uuid: str) -> str:
+    return f'[SUPER TAG:{uuid}]'
+
+def function_line_range(item: Dict) -> tuple:
+    start_line, end_line = item['function_info']['function_lines'].split('-')
+    return int(start_line.strip()), int(end_line.strip())
+
+def group_compatible_items(json_data: List[Dict], batch_size: int) -> List[List[Dict]]:
     """
-    1. Replace code: Replace the original code with the labeled content based on the function_info in covered_log_statement.json. The position needs to be corrected, and the replacement operation needs to be recorded.
-    2. Test execution: mvn clean test -Dtest={test_name}
-    3. Find logs printed by marked log statements in the log files
+    Group uuids that can share one Maven run: same execute_dir, same unit_test, and labeled functions that do not
+    overlap (different files, or disjoint line ranges of the same file). Items are placed greedily into the first
+    compatible batch with room left, so the order of the uuids inside a test class is kept.
     """
-    if os.path.exists(os.path.join(results_dir, "results.jsonl")):
-        results_data = read_jsonl(os.path.join(results_dir, "results.jsonl"))
-    else:
-        results_data = []
-    for index, item in enumerate(json_data):
-        if use_catch_point and load_catch_point(results_data, item['uuid']):
-            continue
+    if batch_size <= 1:
+        return [[item] for item in json_data]
+    batches = []
+    open_batches = {}  # (execute_dir, unit_test) -> batches with room left
+    for item in json_data:
+        key = (item.get('execute_dir'), item.get('unit_test'))
+        position = item['function_info']['function_position']
+        start_line, end_line = function_line_range(item)
+        for batch in open_batches.get(key, []):
+            if all(other['function_info']['function_position'] != position
+                   or function_line_range(other)[1] < start_line or end_line < function_line_range(other)[0]
+                   for other in batch):
+                batch.append(item)
+                if len(batch) == batch_size:
+                    open_batches[key].remove(batch)
+                break
+        else:
+            batch = [item]
+            batches.append(batch)
+            open_batches.setdefault(key, []).append(batch)
+    return batches
+
+def own_log_content(test_log_content: str, tag: str) -> str:
+    """
+    The output of a batched run as a run of the uuid labeled with tag alone would have printed it: lines labeled for
+    the other uuids of the batch are dropped and tag is written back as the plain [SUPER TAG].
+    """
+    if tag == SUPER_TAG:
+        return test_log_content
+    return '\n'.join(line.replace(tag, SUPER_TAG) for line in test_log_content.split('\n')
+                     if tag in line or not BATCH_TAG_PATTERN.search(line))
+
+def save_uuid_logs(uuid: str, test_log_content: str, tag: str, execute_time: float, results_dir: str, logger: logging.Logger, write_lock: threading.Lock = None) -> None:
+    """Write the test output and the [SUPER TAG] lines of the uuid labeled with tag, and record its result"""
+    test_log_content = own_log_content(test_log_content, tag)
+    complete_log_file_path = os.path.join(results_dir, 'complete_logs', f"{uuid}.txt")
+    if not os.path.exists(complete_log_file_path):
+        os.makedirs(os.path.dirname(complete_log_file_path), exist_ok=True)
+    with open(complete_log_file_path, 'w', encoding='utf-8') as f:
+        f.write(test_log_content)
+
+    super_tag_lines = [line for line in test_log_content.split('\n') if SUPER_TAG in line]
+    result_file_path = os.path.join(results_dir, 'output_logs', f"{uuid}.txt")
+    if not os.path.exists(result_file_path):
+        os.makedirs(os.path.dirname(result_file_path), exist_ok=True)
 
-        uuid = item['uuid']
-        function_position = item['function_info']['function_position']
-        function_lines = item['function_info']['function_lines']
-        prediction_data = item['function_with_labeled_data']
-        test_name = item.get('unit_test', 'UNKNOWN_TEST')
-        execute_dir = item.get('execute_dir', 'UNKNOWN_TEST')
+    try:
+        with open(result_file_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(super_tag_lines))
+        logger.info(f"Successfully saved [SUPER TAG] logs to {result_file_path}")
 
-        if not execute_dir or not test_name or not prediction_data:
-            logger.error(f"Missing required data for UUID: {uuid}")
-            continue
+        # get absolute path of write file
+        file_location = os.path.abspath(result_file_path)
+        save_result(True, execute_time, os.path.getsize(result_file_path), os.path.getsize(complete_log_file_path), results_dir, uuid, file_location, write_lock)
+    except Exception as e:
+        logger.error(f"Failed to save [SUPER TAG] logs for UUID {uuid}: {e}")
 
-        try:
-            logger.info(f"--- Processing UUID: {uuid} ---")
-            logger.info(f"--- Current Progress: {index}/{len(json_data)} ---")
+def execute_batch(batch: List[Dict], replace_data_path: str, results_dir: str, logger: logging.Logger, record_error: bool, record_error_path: str, write_lock: threading.Lock = None, incremental: bool = False) -> bool:
+    """
+    Replace the functions of all uuids of the batch, run their test once, split the output per uuid and reverse
+    the replacements. A single uuid is labeled with the plain [SUPER TAG]; in a batch of several every uuid gets
+    [SUPER TAG:<uuid>].
 
-            # 1. Replace code
-            replace_func(function_position, function_lines, prediction_data,
+    A failed batch of several uuids records nothing and returns False, so that its uuids can be run again in smaller
+    batches.
+    """
+    test_name = batch[0].get('unit_test', 'UNKNOWN_TEST')
+    execute_dir = batch[0].get('execute_dir', 'UNKNOWN_TEST')
+    uuids = [item['uuid'] for item in batch]
+    tags = {uuid: SUPER_TAG if len(batch) == 1 else batch_super_tag(uuid) for uuid in uuids}
+    batch_id = uuids[0] if len(batch) == 1 else f"{uuids[0]}+{len(batch) - 1}"
+    # Functions lower in a file are replaced first, so the line numbers of the others stay valid
+    ordered = sorted(batch, key=lambda item: (item['function_info']['function_position'], function_line_range(item)), reverse=True)
+    try:
+        logger.info(f"--- Processing UUID: {', '.join(uuids)} ---")
+
+        # 1. Replace code
+        for item in ordered:
+            uuid = item['uuid']
+            replace_func(item['function_info']['function_position'], item['function_info']['function_lines'],
+                         item['function_with_labeled_data'].replace(SUPER_TAG, tags[uuid]),
                          uuid, replace_data_path, logger)
 
-            # 2. Test execution
-            logger.info(f"Running test: {test_name}")
-            start_time = time.time()
-            execute_success = run_maven_test(test_name, execute_dir, logger, record_error, record_error_path, uuid)
-            execute_time = time.time() - start_time
-
-            if not execute_success:
-                save_result(execute_success, execute_time, 0, 0, results_dir, uuid, '', write_lock)
-                logger.error(f"Failed to run test: {test_name}")
-                continue
-
-            logger.info(f"Test run success for {uuid}.")
-
-            # 处理产生的日志
-            log_file_dir = execute_dir + "/target/surefire-reports"
-            if not os.path.exists(log_file_dir):
-                logger.error(f"Log file directory not found: {log_file_dir}")
-                save_result(False, execute_time, 0, 0, results_dir, uuid, '', write_lock)
-                continue
-            log_files = [f for f in os.listdir(log_file_dir) if f.endswith('output.txt')]
-            test_log_content = ""
-            for log_file in log_files:
-                with open(os.path.join(log_file_dir, log_file), 'r', encoding='utf-8') as f:
-                    test_log_content += f.read()
-            complete_log_file_path = os.path.join(results_dir, 'complete_logs', f"{uuid}.txt")
-            if not os.path.exists(complete_log_file_path):
-                os.makedirs(os.path.dirname(complete_log_file_path), exist_ok=True)
-            with open(complete_log_file_path, 'w', encoding='utf-8') as f:
-                f.write(test_log_content)
-
-            super_tag_lines = [line for line in test_log_content.split('\n') if '[SUPER TAG]' in line]
-            result_file_path = os.path.join(results_dir, 'output_logs', f"{uuid}.txt")
-            if not os.path.exists(result_file_path):
-                os.makedirs(os.path.dirname(result_file_path), exist_ok=True)
-            
-            try:
-                with open(result_file_path, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(super_tag_lines))
-                logger.info(f"Successfully saved [SUPER TAG] logs to {result_file_path}")
-
-                # get absolute path of write file
-                file_location = os.path.abspath(result_file_path)
-                save_result(execute_success, execute_time, os.path.getsize(result_file_path), os.path.getsize(complete_log_file_path), results_dir, uuid, file_location, write_lock)
-            except Exception as e:
-                logger.error(f"Failed to save [SUPER TAG] logs for UUID {uuid}: {e}")
-
-        except Exception as e:
-            logger.error(f"Failed processing UUID {uuid}: {e}")
-        finally:
+        # 2. Test execution
+        logger.info(f"Running test: {test_name}")
+        start_time = time.time()
+        edited_files = sorted({item['function_info']['function_position'] for item in batch})
+        execute_success = run_maven_test(test_name, execute_dir, logger, record_error, record_error_path, batch_id, incremental, edited_files)
+        execute_time = time.time() - start_time
+
+        if not execute_success:
+            logger.error(f"Failed to run test: {test_name}")
+            if len(batch) == 1:
+                save_result(execute_success, execute_time, 0, 0, results_dir, uuids[0], '', write_lock)
+            return False
+
+        logger.info(f"Test run success for {', '.join(uuids)}.")
+
+        # 处理产生的日志
+        log_file_dir = execute_dir + "/target/surefire-reports"
+        if not os.path.exists(log_file_dir):
+            logger.error(f"Log file directory not found: {log_file_dir}")
+            if len(batch) == 1:
+                save_result(False, execute_time, 0, 0, results_dir, uuids[0], '', write_lock)
+            return False
+        log_files = [f for f in os.listdir(log_file_dir) if f.endswith('output.txt')]
+        test_log_content = ""
+        for log_file in log_files:
+            with open(os.path.join(log_file_dir, log_file), 'r', encoding='utf-8') as f:
+                test_log_content += f.read()
+        # Every uuid of the batch is charged the time of the shared run
+        for uuid in uuids:
+            save_uuid_logs(uuid, test_log_content, tags[uuid], execute_time, results_dir, logger, write_lock)
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed processing UUID {', '.join(uuids)}: {e}")
+        return len(batch) == 1
+    finally:
+        # Reversed in the opposite order of the replacements
+        for uuid in reversed([item['uuid'] for item in ordered]):
             logger.info(
                 f"Attempting to reverse changes for failed UUID: {uuid}")
             try:
@@ -171,7 +297,51 @@ def execute_unittest(json_data: List[Dict], replace_data_path: str, results_dir:
                 logger.error(
                     f"Failed to reverse changes for UUID {uuid}: {reverse_e}")
                 sys.exit(1)
-            logger.info(f"--- End Process UUID: {uuid} ---")
+        if incremental:
+            # The labeled classes must not outlive the labeled sources, the next build compiles the originals again
+            invalidate_classes(sorted({item['function_info']['function_position'] for item in batch}), logger)
+        logger.info(f"--- End Process UUID: {', '.join(uuids)} ---")
+
+def execute_bisecting(batch: List[Dict], replace_data_path: str, results_dir: str, logger: logging.Logger, record_error: bool, record_error_path: str, write_lock: threading.Lock = None, incremental: bool = False) -> None:
+    """Run a batch; the two halves of a failed batch of several uuids are run again separately, down to single uuids."""
+    pending = [batch]
+    while pending:
+        batch = pending.pop()
+        if not execute_batch(batch, replace_data_path, results_dir, logger, record_error, record_error_path, write_lock, incremental) and len(batch) > 1:
+            middle = len(batch) // 2
+            logger.info(f"Batch of {len(batch)} UUIDs failed, running its halves of {middle} and {len(batch) - middle} separately")
+            # The first half is run first
+            pending.extend([batch[middle:], batch[:middle]])
+
+def execute_unittest(json_data: List[Dict], replace_data_path: str, results_dir: str, logger: logging.Logger, use_catch_point: bool, record_error: bool, record_error_path: str, write_lock: threading.Lock = None, batch_size: int = 1, incremental: bool = False) -> None:
+    """
+    1. Replace code: Replace the original code with the labeled content based on the function_info in covered_log_statement.json. The position needs to be corrected, and the replacement operation needs to be recorded.
+    2. Test execution: mvn clean test -Dtest={test_name}
+    3. Find logs printed by marked log statements in the log files
+
+    With batch_size > 1, up to batch_size compatible uuids (see group_compatible_items) share one test run. A batch
+    whose run fails is bisected: each half is run again, down to single uuids, so one broken labeled function does
+    not fail the others and only the halves containing it are repeated.
+    """
+    if os.path.exists(os.path.join(results_dir, "results.jsonl")):
+        results_data = read_jsonl(os.path.join(results_dir, "results.jsonl"))
+    else:
+        results_data = []
+    pending = []
+    for item in json_data:
+        if use_catch_point and load_catch_point(results_data, item['uuid']):
+            continue
+        if not item.get('execute_dir', 'UNKNOWN_TEST') or not item.get('unit_test', 'UNKNOWN_TEST') or not item['function_with_labeled_data']:
+            logger.error(f"Missing required data for UUID: {item['uuid']}")
+            continue
+        pending.append(item)
+
+    batches = group_compatible_items(pending, batch_size)
+    done = 0
+    for batch in batches:
+        logger.info(f"--- Current Progress: {done}/{len(pending)} ---")
+        execute_bisecting(batch, replace_data_path, results_dir, logger, record_error, record_error_path, write_lock, incremental)
+        done += len(batch)
 
 def classify_data_for_multi_thread(json_data: List[Dict]) -> Dict[str, List[Dict]]:
     """
@@ -191,18 +361,109 @@ def classify_data_for_multi_thread(json_data: List[Dict]) -> Dict[str, List[Dict
         classify_data[execute_dir].append(item)
     return classify_data
 
-def execute_unittest_thread(json_path: str, replace_data_path: str, results_dir: str, logger: logging.Logger, use_catch_point: bool, record_error: bool, record_error_path: str, num_thread: int) -> None:
+def split_for_sandboxes(classify_data: Dict[str, List[Dict]], sandbox_workers: int) -> List[Dict[str, Any]]:
+    """
+    Split the uuids of every execute_dir over up to sandbox_workers sandboxes of that module, round robin.
+    uuids whose function file lies outside execute_dir cannot be isolated by a module clone and stay in one
+    task on the shared checkout.
+
+    return a list of tasks {'execute_dir', 'sandbox_index', 'items'}, sandbox_index is None for the shared checkout
+    """
+    tasks = []
+    for execute_dir, data_item_list in classify_data.items():
+        module_dir = os.path.abspath(execute_dir).rstrip('/') + '/'
+        inside = [item for item in data_item_list
+                  if os.path.abspath(item['function_info']['function_position']).startswith(module_dir)]
+        outside = [item for item in data_item_list
+                   if not os.path.abspath(item['function_info']['function_position']).startswith(module_dir)]
+        num_sandboxes = min(sandbox_workers, len(inside))
+        for sandbox_index in range(num_sandboxes):
+            tasks.append({'execute_dir': execute_dir, 'sandbox_index': sandbox_index, 'items': inside[sandbox_index::num_sandboxes]})
+        if outside:
+            tasks.append({'execute_dir': execute_dir, 'sandbox_index': None, 'items': outside})
+    return tasks
+
+def create_task_sandbox(task: Dict[str, Any], sandbox_method: str, logger: logging.Logger) -> Optional[ModuleSandbox]:
+    """Clone the module of a sandbox task, None when the clone fails."""
+    sandbox = ModuleSandbox(task['execute_dir'], task['sandbox_index'], sandbox_method, logger)
+    try:
+        sandbox.create()
+        return sandbox
+    except Exception as e:
+        logger.error(f"Failed to create sandbox {task['sandbox_index']} of {task['execute_dir']}: {e}")
+        sandbox.remove()
+        return None
+
+def execute_unittest_sandboxed(task: Dict[str, Any], sandbox: Optional[ModuleSandbox], replace_data_path: str, results_dir: str, logger: logging.Logger, use_catch_point: bool, record_error: bool, record_error_path: str, write_lock: threading.Lock = None, batch_size: int = 1, incremental: bool = False) -> None:
+    """
+    Run the uuids of one task in its clone of the module, created beforehand by create_task_sandbox. Every uuid is
+    patched, tested and reversed inside the sandbox, the shared checkout is never modified. The sandbox is removed
+    when the task ends. A task without a sandbox runs on the shared checkout.
+    """
+    if sandbox is None:
+        execute_unittest(task['items'], replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, write_lock, batch_size, incremental)
+        return
+
+    try:
+        sandbox_items = []
+        for item in task['items']:
+            item = dict(item, execute_dir=sandbox.sandbox_dir)
+            item['function_info'] = dict(item['function_info'], function_position=sandbox.remap(item['function_info']['function_position']))
+            sandbox_items.append(item)
+        execute_unittest(sandbox_items, replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, write_lock, batch_size, incremental)
+    finally:
+        sandbox.remove()
+
+def execute_unittest_thread(json_path: str, replace_data_path: str, results_dir: str, logger: logging.Logger, use_catch_point: bool, record_error: bool, record_error_path: str, num_thread: int, sandbox_workers: int = 0, sandbox_method: str = 'auto', batch_size: int = 1, incremental: bool = False) -> None:
     """
     return a dictionary, key is execute_dir, value is a list of unit_test, different execute_dir can be processed in parallel
+
+    With sandbox_workers > 0, the uuids of one execute_dir are also spread over up to sandbox_workers clones of
+    the module, so a large module is processed by several threads.
     """
     if not os.path.exists(json_path):
         logger.error(f"Json file not found: {json_path}")
         return
     json_data = read_json(json_path)
     classify_data = classify_data_for_multi_thread(json_data)
-    if num_thread == 1:
-        for _, data_item_list in classify_data.items():
-            execute_unittest(data_item_list, replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path)
+    if sandbox_workers > 0:
+        tasks = split_for_sandboxes(classify_data, sandbox_workers)
+        if use_catch_point and os.path.exists(os.path.join(results_dir, "results.jsonl")):
+            results_data = read_jsonl(os.path.join(results_dir, "results.jsonl"))
+            for task in tasks:
+                task['items'] = [item for item in task['items'] if not load_catch_point(results_data, item['uuid'])]
+            tasks = [task for task in tasks if task['items']]
+        write_lock = threading.Lock()
+        sandboxes = {}
+        try:
+            with ThreadPoolExecutor(max_workers=num_thread) as executor:
+                # Every clone is made before any task starts: the tasks on the shared checkout rewrite files of the
+                # modules, and a clone made at the same time could capture their labeled versions
+                sandbox_tasks = [index for index, task in enumerate(tasks) if task['sandbox_index'] is not None]
+                clones = executor.map(lambda index: create_task_sandbox(tasks[index], sandbox_method, logger), sandbox_tasks)
+                sandboxes = dict(zip(sandbox_tasks, clones))
+                runnable = [index for index in range(len(tasks)) if index not in sandboxes or sandboxes[index] is not None]
+                futures = {
+                    executor.submit(execute_unittest_sandboxed, tasks[index], sandboxes.get(index), replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, write_lock, batch_size, incremental): tasks[index]
+                    for index in runnable
+                }
+                for index, future in enumerate(as_completed(futures)):
+                    task = futures[future]
+                    project_name = '/'.join(task['execute_dir'].split('/')[3:])
+                    try:
+                        future.result()
+                        logger.info(f"Project {project_name} (sandbox {task['sandbox_index']}) completed successfully")
+                    except Exception as e:
+                        logger.error(f"Error processing project {project_name} (sandbox {task['sandbox_index']}): {e}")
+                    logger.info(f"==========Current progress: {index + 1}/{len(futures)}==========")
+        finally:
+            # Sandboxes of tasks that did not run to the end
+            for sandbox in sandboxes.values():
+                if sandbox is not None:
+                    sandbox.remove()
+    elif num_thread == 1:
+        for index, data_item_list in enumerate(classify_data.values()):
+            execute_unittest(data_item_list, replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, None, batch_size, incremental)
             project_name = '/'.join(data_item_list[0]['execute_dir'].split('/')[3:])
             logger.info(f"Project {project_name} completed successfully")
             logger.info(f"==========Current progress: {index + 1}/{len(classify_data)}==========")
@@ -210,7 +471,7 @@ def execute_unittest_thread(json_path: str, replace_data_path: str, results_dir:
         write_lock = threading.Lock()
         with ThreadPoolExecutor(max_workers=num_thread) as executor:
             futures = {
-                executor.submit(execute_unittest, data_item_list, replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, write_lock): data_item_list
+                executor.submit(execute_unittest, data_item_list, replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, write_lock, batch_size, incremental): data_item_list
                 for data_item_list in classify_data.values()
             }
             for index, future in enumerate(as_completed(futures)):
@@ -241,6 +502,18 @@ def main():
                         help='Record error')
     parser.add_argument('--num_thread', type=int, default=4,
                         help='Number of threads')
+    parser.add_argument('--sandbox_workers', type=int, default=0,
+                        help='Clones per module, so that uuids of one module run in parallel (0: patch the shared checkout)')
+    parser.add_argument('--sandbox_method', type=str, default='auto', choices=SANDBOX_METHODS,
+                        help='How module clones are made')
+    parser.add_argument('--batch_size', type=int, default=1,
+                        help='Compatible uuids (same test, non-overlapping functions) applied together in one Maven run')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip mvn clean and recompile only the edited classes, falling back to clean when they cannot be verified')
+    parser.add_argument('--build_runner', type=str, default='auto', choices=RUNNER_BACKENDS,
+                        help='mvn starts a JVM per test run, mvnd submits the runs to warm Maven daemons (auto: mvnd if installed)')
+    parser.add_argument('--dependency_cache', type=str, default=None,
+                        help='Pre-resolved local repository (see prefetch_dependencies.py), all builds run offline against it (read-only, needs Maven 3.9+)')
 
     # Parse arguments
     args = parser.parse_args()
@@ -256,6 +529,10 @@ def main():
     use_catch_point = args.use_catch_point
     record_error = args.record_error
     num_thread = args.num_thread
+    sandbox_workers = args.sandbox_workers
+    sandbox_method = args.sandbox_method
+    batch_size = args.batch_size
+    incremental = args.incremental
 
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
@@ -271,8 +548,13 @@ def main():
 
     logger = setup_logging(log_dir, log_level=logging.INFO)
 
+    runner = configure_runner(args.build_runner, logger, args.dependency_cache)
+
     # Process json data to support multi-threading
-    execute_unittest_thread(json_path, replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, num_thread)
+    try:
+        execute_unittest_thread(json_path, replace_data_path, results_dir, logger, use_catch_point, record_error, record_error_path, num_thread, sandbox_workers, sandbox_method, batch_size, incremental)
+    finally:
+        runner.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@File: sandbox.py
+@Description:
+  Per-worker clones of a Maven module tree, so that several uuids of the same module can be patched
+  and tested at the same time. A sandbox is created next to the module it clones
+  (<execute_dir>.sandbox<k>), which keeps relative parent-pom paths such as ../pom.xml valid.
+  Clone methods:
+  1. reflink: cp -a --reflink=always, copy-on-write on btrfs/xfs, no data is copied
+  2. overlay: overlayfs mount with the module as the read-only lower layer (needs mount privileges)
+  3. copy: plain recursive copy without the module's target directory
+  4. auto: reflink, falling back to copy when the filesystem does not support it
+"""
+
+import os
+import shutil
+import logging
+import subprocess
+from typing import Optional
+
+SANDBOX_METHODS = ['auto', 'reflink', 'overlay', 'copy']
+
+
+class ModuleSandbox:
+    def __init__(self, source_dir: str, index: int, method: str, logger: logging.Logger):
+        if method not in SANDBOX_METHODS:
+            raise ValueError(f"Unknown sandbox method '{method}', expected one of {SANDBOX_METHODS}")
+        self.source_dir = os.path.abspath(source_dir).rstrip('/')
+        self.sandbox_dir = f"{self.source_dir}.sandbox{index}"
+        # upper and work directories of the overlay mount
+        self.overlay_dir = f"{self.sandbox_dir}.overlay"
+        self.method = method
+        self.logger = logger
+        self.mounted = False
+
+    def create(self) -> str:
+        """Clone the module tree and return the sandbox directory. A leftover sandbox of an interrupted run is replaced."""
+        self.remove()
+        method = self.method
+        if method in ('auto', 'reflink'):
+            result = subprocess.run(["cp", "-a", "--reflink=always", self.source_dir, self.sandbox_dir],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode == 0:
+                method = 'reflink'
+            elif method == 'reflink':
+                raise RuntimeError(f"Reflink clone of {self.source_dir} failed: {result.stderr.strip()}")
+            else:
+                shutil.rmtree(self.sandbox_dir, ignore_errors=True)
+                method = 'copy'
+        if method == 'overlay':
+            upper_dir = os.path.join(self.overlay_dir, 'upper')
+            work_dir = os.path.join(self.overlay_dir, 'work')
+            for path in (upper_dir, work_dir, self.sandbox_dir):
+                os.makedirs(path, exist_ok=True)
+            subprocess.run(["mount", "-t", "overlay", "overlay", "-o",
+                            f"lowerdir={self.source_dir},upperdir={upper_dir},workdir={work_dir}", self.sandbox_dir],
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self.mounted = True
+        elif method == 'copy':
+            # The build output of the module is not needed, every test run starts with mvn clean
+            shutil.copytree(self.source_dir, self.sandbox_dir, symlinks=True,
+                            ignore=lambda path, names: ['target'] if path == self.source_dir and 'target' in names else [])
+        self.logger.info(f"Created {method} sandbox {self.sandbox_dir} of {self.source_dir}")
+        return self.sandbox_dir
+
+    def remap(self, path: str) -> Optional[str]:
+        """Path of a file of the module inside the sandbox, None for a file outside the module."""
+        path = os.path.abspath(path)
+        if path != self.source_dir and not path.startswith(self.source_dir + '/'):
+            return None
+        return self.sandbox_dir + path[len(self.source_dir):]
+
+    def remove(self) -> None:
+        if self.mounted or os.path.ismount(self.sandbox_dir):
+            subprocess.run(["umount", self.sandbox_dir], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.mounted = False
+        for path in (self.sandbox_dir, self.overlay_dir):
+            if os.path.lexists(path):
+                shutil.rmtree(path, ignore_errors=True)
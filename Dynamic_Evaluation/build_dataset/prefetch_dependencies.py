@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@File: prefetch_dependencies.py
+@Description:
+  Resolves everything the test runs of the projects in potential_dir.json need into one local repository, while
+  the network is available. find_covered_log_statement.py (--dependency-cache) and execute_unittest.py
+  (--dependency_cache) then run every build offline against it.
+  1. Install the whole source tree once (install -DskipTests at the code root), so the SNAPSHOT artifacts of the
+     sibling modules are in the cache
+  2. For every project: dependency:go-offline, then one real test run, which also resolves what go-offline misses
+     (surefire providers, plugins resolved at run time such as the jacoco agent)
+  Finished projects are recorded in <cache>/prefetch_result.jsonl and skipped when the stage is run again.
+"""
+
+import os
+import json
+import logging
+import argparse
+from typing import List, Dict, Any
+
+from build_runner import RUNNER_BACKENDS, create_runner, BuildRunner
+
+PREFETCH_RESULT = 'prefetch_result.jsonl'
+
+
+def load_prefetched(dependency_cache: str) -> set:
+    result_path = os.path.join(dependency_cache, PREFETCH_RESULT)
+    if not os.path.exists(result_path):
+        return set()
+    with open(result_path, 'r', encoding='utf-8') as f:
+        return {item['project_dir'] for item in map(json.loads, f) if item['success']}
+
+
+def record_prefetched(dependency_cache: str, project_dir: str, success: bool) -> None:
+    with open(os.path.join(dependency_cache, PREFETCH_RESULT), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"project_dir": project_dir, "success": success}) + '\n')
+
+
+def prefetch_project(runner: BuildRunner, project_dir: str, test_list: List[str], logger: logging.Logger) -> bool:
+    result = runner.run(["dependency:go-offline"], cwd=project_dir)
+    if result.returncode != 0:
+        logger.error(f"dependency:go-offline failed in {project_dir}:\n{result.stdout[-2000:]}")
+        return False
+    if test_list:
+        # The outcome of the test does not matter, only that its plugins and providers were resolved
+        result = runner.run(["test", f"-Dtest={test_list[0]}", "-DfailIfNoTests=false", "-Dsurefire.failIfNoSpecifiedTests=false"], cwd=project_dir)
+        if 'Could not resolve' in result.stdout or 'Could not transfer' in result.stdout:
+            logger.error(f"Dependencies of the test run in {project_dir} could not be resolved:\n{result.stdout[-2000:]}")
+            return False
+    return True
+
+
+def prefetch_dependencies(projects: List[Dict[str, Any]], code_root: str, dependency_cache: str, logger: logging.Logger, backend: str = 'auto', install_root: bool = True) -> List[str]:
+    """
+    Fill dependency_cache for the projects of potential_dir.json (entries with project_dir and test_list).
+
+    return the project_dirs that could not be resolved, their builds will fail offline
+    """
+    os.makedirs(dependency_cache, exist_ok=True)
+    # The cache is the (writable) local repository while it is filled
+    runner = create_runner(backend, logger, offline=False, dependency_cache=os.path.abspath(dependency_cache), read_only_cache=False)
+    prefetched = load_prefetched(dependency_cache)
+    failed = []
+    try:
+        if install_root and code_root not in prefetched:
+            logger.info(f"Installing {code_root} into {dependency_cache}")
+            result = runner.run(["install", "-DskipTests"], cwd=code_root)
+            record_prefetched(dependency_cache, code_root, result.returncode == 0)
+            if result.returncode != 0:
+                logger.error(f"Install of {code_root} failed:\n{result.stdout[-2000:]}")
+
+        for index, project in enumerate(projects):
+            if project["project_dir"] in prefetched:
+                continue
+            project_dir = os.path.join(code_root, project["project_dir"])
+            logger.info(f"Prefetching {project['project_dir']} ({index + 1}/{len(projects)})")
+            success = os.path.exists(project_dir) and prefetch_project(runner, project_dir, project.get("test_list", []), logger)
+            record_prefetched(dependency_cache, project["project_dir"], success)
+            if not success:
+                failed.append(project["project_dir"])
+    finally:
+        runner.close()
+    logger.info(f"Prefetch finished, {len(failed)} projects could not be resolved")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve the dependencies of all test projects into an offline cache')
+    parser.add_argument('--potential-dir', type=str, default='/home/al-bench/AL-Bench/Dynamic_Evaluation/initial_project/data/test.json',
+                      help='Path to project list JSON file')
+    parser.add_argument('--code-root', type=str, default='/home/al-bench/hadoop-3.4.0-src',
+                      help='Hadoop project root directory in Docker')
+    parser.add_argument('--dependency-cache', type=str, required=True,
+                      help='Local repository to fill')
+    parser.add_argument('--build-runner', choices=RUNNER_BACKENDS, default='auto',
+                      help='mvn starts a JVM per build, mvnd submits the builds to warm Maven daemons (auto: mvnd if installed)')
+    parser.add_argument('--skip-root-install', action='store_true',
+                      help='Do not install the whole source tree first')
+    args = parser.parse_args()
+
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+
+    with open(args.potential_dir, 'r') as f:
+        projects = json.load(f)
+    prefetch_dependencies(projects, args.code_root, args.dependency_cache, logger, args.build_runner, not args.skip_root_install)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Maven command lines built by build_runner.py.
+
+Run with: python -m pytest Dynamic_Evaluation/build_dataset/test_build_runner.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from build_runner import BuildRunner, MvndRunner, MvnRunner
+
+CACHE = '/data/m2-cache'
+GOALS = ['test', '-Dtest=FooTest']
+
+
+def test_read_only_cache_is_the_local_repository_tail():
+    runner = MvnRunner(offline=True, dependency_cache=CACHE)
+    assert runner.command(GOALS) == ['mvn', '-o', f'-Dmaven.repo.local.tail={CACHE}', 'test', '-Dtest=FooTest']
+
+
+def test_writable_cache_is_the_local_repository():
+    runner = MvnRunner(offline=False, dependency_cache=CACHE, read_only_cache=False)
+    assert runner.command(GOALS) == ['mvn', f'-Dmaven.repo.local={CACHE}', 'test', '-Dtest=FooTest']
+
+
+def test_no_cache():
+    assert MvnRunner().command(GOALS) == ['mvn', 'test', '-Dtest=FooTest']
+
+
+@pytest.mark.parametrize('read_only_cache, cache_option', [
+    (True, f'-Dmaven.repo.local.tail={CACHE}'),
+    (False, f'-Dmaven.repo.local={CACHE}'),
+])
+def test_mvnd_command(read_only_cache, cache_option):
+    runner = MvndRunner(offline=read_only_cache, dependency_cache=CACHE, read_only_cache=read_only_cache)
+    try:
+        expected = ['mvnd', '-B', '--raw-streams', f'-Dmvnd.daemonStorage={runner.daemon_storage}']
+        expected += (['-o'] if read_only_cache else []) + [cache_option] + GOALS
+        assert runner.command(GOALS) == expected
+        # The fallback runs the same build with plain mvn
+        assert runner.fallback.command(GOALS) == ['mvn'] + expected[4:]
+    finally:
+        os.rmdir(runner.daemon_storage)
+
+
+def test_build_runner_is_abstract():
+    with pytest.raises(TypeError):
+        BuildRunner()
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import json
 from tqdm import tqdm
-from sacrebleu import sentence_bleu
-from rouge_score import rouge_scorer
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from log_similarity import COSINE_MODES, get_scorer
+from metric_cache import DEFAULT_MAX_ENTRIES, MetricCache, metric_config
+from output_log_reader import OutputLogReader
+from result_table import write_result_table
+from streaming_similarity import stream_score_files
 
 def read_json(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -20,96 +24,132 @@ def get_true_prediction_file(item):
     return read_txt(item['file_location'])
 
 def calculate_rouge_score(reference, candidate):
-    scorer = rouge_scorer.RougeScorer(
-        ['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
-    scores = scorer.score(reference, candidate)
-    return {
-        'rouge-1': {
-            'recall': scores['rouge1'].recall,
-            'precision': scores['rouge1'].precision,
-            'fmeasure': scores['rouge1'].fmeasure
-        },
-        'rouge-2': {
-            'recall': scores['rouge2'].recall,
-            'precision': scores['rouge2'].precision,
-            'fmeasure': scores['rouge2'].fmeasure
-        },
-        'rouge-l': {
-            'recall': scores['rougeL'].recall,
-            'precision': scores['rougeL'].precision,
-            'fmeasure': scores['rougeL'].fmeasure
-        }
-    }
+    return get_scorer().rouge(reference, candidate)
 
 
 def calculate_cosine_similarity(text1, text2):
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform([text1, text2])
-    cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-    return cosine_sim[0][0]
-
-
-def calculate_bleu_score(tokens_real, tokens_pred, bleu_score_record):
-    bleu = sentence_bleu(tokens_real, [tokens_pred], smooth_method='none')
-
-    bleu_score_record['total_bleu_score'] += bleu.score
-    bleu_score_record['total_bleu1_score'] += bleu.precisions[0]
-    bleu_score_record['total_bleu2_score'] += bleu.precisions[1]
-    bleu_score_record['total_bleu3_score'] += bleu.precisions[2]
-    bleu_score_record['total_bleu4_score'] += bleu.precisions[3]
-
-    return {
-        'bleu': bleu.score,
-        'bleu_1': bleu.precisions[0],
-        'bleu_2': bleu.precisions[1],
-        'bleu_3': bleu.precisions[2],
-        'bleu_4': bleu.precisions[3]
-    }
+    return get_scorer().cosine(text1, text2)
+
+
+def record_bleu_score(bleu_score, bleu_score_record):
+    bleu_score_record['total_bleu_score'] += bleu_score['bleu']
+    bleu_score_record['total_bleu1_score'] += bleu_score['bleu_1']
+    bleu_score_record['total_bleu2_score'] += bleu_score['bleu_2']
+    bleu_score_record['total_bleu3_score'] += bleu_score['bleu_3']
+    bleu_score_record['total_bleu4_score'] += bleu_score['bleu_4']
+
+
+def calculate_bleu_score(tokens_real, tokens_pred, bleu_score_record=None):
+    bleu_score = get_scorer().bleu(tokens_real, tokens_pred)
+    if bleu_score_record is not None:
+        record_bleu_score(bleu_score, bleu_score_record)
+
+    return bleu_score
 
 
 def read_txt(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        # 读取文件内容，划分为数组
-        res = []
-        content = f.read().split('\n')
-        for item in content:
-            res.append(item.split('[SUPER TAG]').pop())
-        # 将数组转换为字符串返回
-        return ''.join(res)
+    # 通过内存映射逐行取出 [SUPER TAG] 之后的内容，不再生成中间数组
+    with OutputLogReader(file_path) as reader:
+        return reader.text()
 
 
 def r(x):
     return round(x * 100, 4)
 
 
-def get_common_case(compare_data, baseline_data):
+# Number of cases sent to a worker process at a time in parallel mode
+SCORE_CHUNK_SIZE = 16
+# Output logs larger than this (bytes) are skipped, or scored by the streaming engine
+MAX_FILE_SIZE = 50000
+# json: eval_res.json (original); parquet: eval_res.parquet, one row per uuid; both: write both files
+RESULT_FORMATS = ['json', 'parquet', 'both']
+
+
+def build_uuid_index(data):
+    # uuid -> record, built once per results file so joins are O(1) lookups
+    return {item['uuid']: item for item in data}
+
+
+def iter_joined_records(compare_data, baseline_index):
+    """
+    Stream (baseline, prediction) record pairs for every successfully executed
+    prediction whose uuid also exists in the baseline index.
+    """
+    for item in compare_data:
+        if not item['execute_success']:
+            continue
+        baseline_item = baseline_index.get(item['uuid'])
+        if baseline_item is not None:
+            yield baseline_item, item
+
+
+def get_common_case(compare_data, baseline_index):
     common_case = []
     
-    for item in compare_data:
-        if item['execute_success']:
-            baseline_item = next((b for b in baseline_data if b['uuid'] == item['uuid']), None)
-            if baseline_item:
-                baseline_item_size = baseline_item['file_size']
-                item_size = item['file_size']
-                
-                if baseline_item_size != 0 and item_size != 0:
-                    common_case.append({
-                        'uuid': item['uuid'],
-                        'baseline_size': baseline_item_size,
-                        'compare_size': item_size
-                    })
-                if baseline_item_size == 0 and item_size == 0:
-                    common_case.append({
-                        'uuid': item['uuid'],
-                        'baseline_size': baseline_item_size,
-                        'compare_size': item_size
-                    })
+    for baseline_item, item in iter_joined_records(compare_data, baseline_index):
+        baseline_item_size = baseline_item['file_size']
+        item_size = item['file_size']
+
+        if baseline_item_size != 0 and item_size != 0:
+            common_case.append({
+                'uuid': item['uuid'],
+                'baseline_size': baseline_item_size,
+                'compare_size': item_size
+            })
+        if baseline_item_size == 0 and item_size == 0:
+            common_case.append({
+                'uuid': item['uuid'],
+                'baseline_size': baseline_item_size,
+                'compare_size': item_size
+            })
     
     return common_case
 
-def evaluate_model_results(evaluate_model_name, baseline_data):
+def score_case(baseline_item, prediction_item, streaming=False, with_cosine=True):
+    """
+    Score one common case. Runs in worker processes in parallel mode, so it only
+    takes picklable records and reads the log files itself. Streaming cases always
+    include the cosine similarity.
+    """
+    if streaming:
+        return stream_score_files(baseline_item['file_location'], prediction_item['file_location'])
+
+    baseline_item_text = get_true_prediction_file(baseline_item)
+    prediction_item_text = get_true_prediction_file(prediction_item)
+
+    # 每个进程复用同一个 scorer
+    scorer = get_scorer()
+    score = {
+        'bleu_score': scorer.bleu(baseline_item_text, prediction_item_text),
+        'rouge_score': scorer.rouge(baseline_item_text, prediction_item_text)
+    }
+    if with_cosine:
+        score['cosine_similarity'] = scorer.cosine(baseline_item_text, prediction_item_text)
+    return score
+
+
+def start_workers(executor, num_workers):
+    """
+    Start every worker of the pool before any other thread exists. The pool is shared by the model threads; a
+    worker forked later, from inside one of them, could inherit a lock (logging, the metric cache) held by another
+    thread and deadlock.
+    """
+    for future in [executor.submit(os.getpid) for _ in range(num_workers)]:
+        future.result()
+
+
+def calculate_cosine_batch(baseline_items, prediction_items, cosine_mode):
+    baseline_texts = [get_true_prediction_file(item) for item in baseline_items]
+    prediction_texts = [get_true_prediction_file(item) for item in prediction_items]
+    return get_scorer().cosine_batch(baseline_texts, prediction_texts, cosine_mode)
+
+
+def evaluate_model_results(evaluate_model_name, baseline_index, executor=None, cosine_mode='pair',
+                           max_file_size=MAX_FILE_SIZE, stream_large_files=False, metric_cache=None,
+                           result_format='json'):
     prediction_data = read_jsonl(f'./data/res/{evaluate_model_name}.jsonl')
-    common_case = get_common_case(prediction_data, baseline_data)
+    prediction_index = build_uuid_index(prediction_data)
+    common_case = get_common_case(prediction_data, baseline_index)
 
     perfect_list = []
     common_evaluate_list = []
@@ -121,50 +161,126 @@ def evaluate_model_results(evaluate_model_name, baseline_data):
         'total_bleu4_score': 0
     }
 
-    for d in tqdm(common_case):
+    score_case_list = []
+    for d in common_case:
         if d['baseline_size'] == d['compare_size'] == 0:
             perfect_list.append(d)
             continue
-        if d['baseline_size'] > 50000 or d['compare_size'] > 50000:
+        if (d['baseline_size'] > max_file_size or d['compare_size'] > max_file_size) and not stream_large_files:
             continue
+        score_case_list.append(d)
+
+    baseline_items = [baseline_index[d['uuid']] for d in score_case_list]
+    prediction_items = [prediction_index[d['uuid']] for d in score_case_list]
+    stream_flags = [d['baseline_size'] > max_file_size or d['compare_size'] > max_file_size for d in score_case_list]
+    # pair 模式在每个 case 内计算余弦相似度，其余模式在所有非流式 case 上一次性向量化计算
+    cosine_list = None
+    if cosine_mode != 'pair':
+        batch_index = [index for index, streaming in enumerate(stream_flags) if not streaming]
+        batch_cosine = calculate_cosine_batch([baseline_items[index] for index in batch_index],
+                                              [prediction_items[index] for index in batch_index], cosine_mode)
+        cosine_list = dict(zip(batch_index, batch_cosine))
+    score_func = partial(score_case, with_cosine=cosine_list is None)
 
-        uuid = d['uuid']
-        baseline_item = [
-            item for item in baseline_data if item['uuid'] == uuid].pop()
-        prediction_item = [
-            item for item in prediction_data if item['uuid'] == uuid].pop()
-
-        baseline_item_text = get_true_prediction_file(baseline_item)
-        prediction_item_text = get_true_prediction_file(prediction_item)
-
-        # bleu_score
-        d['bleu_score'] = calculate_bleu_score(
-            baseline_item_text, prediction_item_text, bleu_score_record)
-        # rouge_score
-        d['rouge_score'] = calculate_rouge_score(
-            baseline_item_text, prediction_item_text)
-        d['cosine_similarity'] = calculate_cosine_similarity(
-            baseline_item_text, prediction_item_text)
+    # 命中缓存的 case 直接复用结果，只对未命中的 case 打分
+    scores = [None] * len(score_case_list)
+    cache_keys = None
+    if metric_cache is not None:
+        cache_keys = [
+            metric_cache.make_key(baseline_item['file_location'], prediction_item['file_location'],
+                                  metric_config(streaming=streaming, with_cosine=cosine_list is None))
+            for baseline_item, prediction_item, streaming in zip(baseline_items, prediction_items, stream_flags)
+        ]
+        scores = metric_cache.get_many(cache_keys)
+    miss_index = [index for index, score in enumerate(scores) if score is None]
+    miss_args = (
+        [baseline_items[index] for index in miss_index],
+        [prediction_items[index] for index in miss_index],
+        [stream_flags[index] for index in miss_index]
+    )
+
+    if executor is None:
+        computed_scores = map(score_func, *miss_args)
+    else:
+        # executor.map 按提交顺序返回结果，保证与串行路径的累加顺序一致
+        computed_scores = executor.map(score_func, *miss_args, chunksize=SCORE_CHUNK_SIZE)
+
+    new_cache_entries = []
+    for index, d in enumerate(tqdm(score_case_list, desc=evaluate_model_name)):
+        score = scores[index]
+        if score is None:
+            score = next(computed_scores)
+            if cache_keys is not None:
+                new_cache_entries.append((cache_keys[index], score))
+        record_bleu_score(score['bleu_score'], bleu_score_record)
+        d.update(score)
+        if cosine_list is not None and index in cosine_list:
+            d['cosine_similarity'] = float(cosine_list[index])
         d['success'] = True
         common_evaluate_list.append(d)
+    if new_cache_entries:
+        metric_cache.put_many(new_cache_entries)
 
     # 保存评估结果到 data/eval_res/evaluate_model_name.jsonl
     if not os.path.exists('./data/eval_res'):
         os.makedirs('./data/eval_res')
     if not os.path.exists(f'./data/eval_res/{evaluate_model_name}'):
         os.makedirs(f'./data/eval_res/{evaluate_model_name}')
-    with open(f'./data/eval_res/{evaluate_model_name}/eval_res.json', 'w', encoding='utf-8') as f:
-        json.dump(common_evaluate_list, f, ensure_ascii=False, indent=2)
+    if result_format in ('json', 'both'):
+        with open(f'./data/eval_res/{evaluate_model_name}/eval_res.json', 'w', encoding='utf-8') as f:
+            json.dump(common_evaluate_list, f, ensure_ascii=False, indent=2)
+    if result_format in ('parquet', 'both'):
+        write_result_table(common_evaluate_list, f'./data/eval_res/{evaluate_model_name}/eval_res.parquet')
     with open(f'./data/eval_res/{evaluate_model_name}/perfect_list.json', 'w', encoding='utf-8') as f:
         json.dump(perfect_list, f, ensure_ascii=False, indent=2)
 
 def main():
+    parser = argparse.ArgumentParser(description='Evaluate dynamic log similarity')
+    parser.add_argument('--num_workers', type=int, default=1,
+                        help='Number of scoring processes, 1 means serial scoring')
+    parser.add_argument('--cosine_mode', type=str, default='pair', choices=COSINE_MODES,
+                        help='pair: per-pair TF-IDF fit (original); pair_vectorized: per-pair IDF in one sparse pass; corpus: IDF fit over all cases')
+    parser.add_argument('--max_file_size', type=int, default=MAX_FILE_SIZE,
+                        help='Output logs larger than this (bytes) are skipped unless --stream_large_files is set')
+    parser.add_argument('--stream_large_files', action='store_true',
+                        help='Score logs larger than --max_file_size with the streaming engine instead of skipping them')
+    parser.add_argument('--metric_cache', type=str, default=None,
+                        help='SQLite file caching per-case scores by log content hash, disabled when not set')
+    parser.add_argument('--metric_cache_max_entries', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help='Least recently used scores beyond this number are evicted from the metric cache')
+    parser.add_argument('--result_format', type=str, default='json', choices=RESULT_FORMATS,
+                        help='json: eval_res.json; parquet: columnar eval_res.parquet (needs pyarrow); both: write both')
+    args = parser.parse_args()
+
     # choose the evaluate model name unilog, unilog_deepseek, fastlog, leonid, leonid_m, lance
     evaluate_model_name_list = ['unilog', 'unilog_deepseek', 'fastlog', 'leonid', 'leonid_m', 'lance']
     baseline_data = read_jsonl(f'./data/res/baseline.jsonl')
+    # 基线索引只构建一次，所有模型共享
+    baseline_index = build_uuid_index(baseline_data)
+    metric_cache = MetricCache(args.metric_cache, args.metric_cache_max_entries) if args.metric_cache else None
+
+    try:
+        if args.num_workers <= 1:
+            for evaluate_model_name in evaluate_model_name_list:
+                evaluate_model_results(evaluate_model_name, baseline_index, cosine_mode=args.cosine_mode,
+                                       max_file_size=args.max_file_size, stream_large_files=args.stream_large_files,
+                                       metric_cache=metric_cache, result_format=args.result_format)
+            return
 
-    for evaluate_model_name in evaluate_model_name_list:
-        evaluate_model_results(evaluate_model_name, baseline_data)
+        # 所有模型共享同一个进程池，每个模型由一个线程负责提交任务和合并结果
+        with ProcessPoolExecutor(max_workers=args.num_workers) as executor:
+            start_workers(executor, args.num_workers)
+            with ThreadPoolExecutor(max_workers=len(evaluate_model_name_list)) as model_executor:
+                futures = [
+                    model_executor.submit(evaluate_model_results, evaluate_model_name, baseline_index, executor, args.cosine_mode,
+                                          args.max_file_size, args.stream_large_files, metric_cache, args.result_format)
+                    for evaluate_model_name in evaluate_model_name_list
+                ]
+                for future in futures:
+                    future.result()
+    finally:
+        if metric_cache is not None:
+            metric_cache.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import json
 import sys
 import os
 import argparse
+import numpy as np
 from tabulate import tabulate  # pip install tabulate
+from record_stream import iter_json_records
+from result_table import success_metric_matrix
 
 # All models to evaluate
 ALL_MODELS = [
@@ -20,66 +22,125 @@ ALL_MODELS = [
 def r(x):
     return round(x * 100 * 10000) / 10000
 
-def evaluateModel(model_name):
-    with open(f"./data/eval_res/{model_name}/eval_res.json", "r", encoding="utf-8") as f:
-        evaluation_res = json.load(f)
-    
-    with open(f"./data/eval_res/{model_name}/perfect_list.json", "r", encoding="utf-8") as f:
-        perfect_list = json.load(f)
-    
-    valid_length = 2238
+# Number of records summed together by one vectorized block reduction
+BLOCK_SIZE = 4096
+
+# Denominator used by the published results. With valid_length='auto' it is derived from the data instead
+VALID_LENGTH = 2238
+
+ROUGE_FIELDS = [
+    (rouge_type, measure)
+    for rouge_type in ["rouge-1", "rouge-2", "rouge-l"]
+    for measure in ["recall", "precision", "fmeasure"]
+]
+BLEU_FIELDS = ["bleu", "bleu_1", "bleu_2", "bleu_3", "bleu_4"]
+# Column order of the accumulator: 9 ROUGE values, 5 BLEU values, cosine similarity
+NUM_FIELDS = len(ROUGE_FIELDS) + len(BLEU_FIELDS) + 1
+
+
+class MetricAccumulator:
+    """
+    Sums the metric columns of successful eval_res records in constant memory. Records are
+    written into a fixed-size block which is reduced with one numpy sum when it is full.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.totals = np.zeros(NUM_FIELDS)
+        self.count = 0
+        self._block = np.empty((block_size, NUM_FIELDS))
+        self._rows = 0
+
+    def add(self, item):
+        if item["success"] != True:
+            return
+        rouge_score = item["rouge_score"]
+        bleu_score = item["bleu_score"]
+        row = [rouge_score[rouge_type][measure] for rouge_type, measure in ROUGE_FIELDS]
+        row.extend(bleu_score[field] for field in BLEU_FIELDS)
+        row.append(item["cosine_similarity"])
+        self._block[self._rows] = row
+        self._rows += 1
+        self.count += 1
+        if self._rows == len(self._block):
+            self.flush()
+
+    def add_rows(self, matrix):
+        """Add a (rows, NUM_FIELDS) array of successful records with one reduction."""
+        self.flush()
+        self.totals += matrix.sum(axis=0)
+        self.count += len(matrix)
+
+    def flush(self):
+        if self._rows:
+            self.totals += self._block[:self._rows].sum(axis=0)
+            self._rows = 0
+
+    def result(self):
+        """Return (total_rouge_score, total_bleu_score, cosine_similarity) in the evaluateModel layout."""
+        self.flush()
+        total_rouge_score = {}
+        for (rouge_type, measure), value in zip(ROUGE_FIELDS, self.totals):
+            total_rouge_score.setdefault(rouge_type, {})[measure] = float(value)
+        offset = len(ROUGE_FIELDS)
+        total_bleu_score = {
+            field: float(value)
+            for field, value in zip(BLEU_FIELDS, self.totals[offset:offset + len(BLEU_FIELDS)])
+        }
+        return total_rouge_score, total_bleu_score, float(self.totals[-1])
+
+
+def evalResPath(model_name):
+    # eval_res.py may write several formats, use the most recently written one
+    candidates = [
+        f"./data/eval_res/{model_name}/eval_res.{extension}"
+        for extension in ["parquet", "jsonl", "json"]
+    ]
+    existing = [path for path in candidates if os.path.exists(path)]
+    if not existing:
+        return candidates[-1]
+    return max(existing, key=os.path.getmtime)
+
+
+def deriveValidLength(baseline_path="./data/res/baseline.jsonl"):
+    """Number of baseline cases that executed successfully, the denominator of every average."""
+    if not os.path.exists(baseline_path):
+        return VALID_LENGTH
+    return sum(1 for item in iter_json_records(baseline_path) if item["execute_success"])
+
+
+def accumulateModels(model_names):
+    """Read every model's result files once and return {model_name: (accumulator, perfect_matches)}."""
+    accumulated = {}
+    for model_name in model_names:
+        accumulator = MetricAccumulator()
+        eval_res_path = evalResPath(model_name)
+        if eval_res_path.endswith(".parquet"):
+            # Column order of the parquet metrics matches the accumulator fields
+            accumulator.add_rows(success_metric_matrix(eval_res_path))
+        else:
+            for item in iter_json_records(eval_res_path):
+                accumulator.add(item)
+        perfect_matches = sum(1 for _ in iter_json_records(f"./data/eval_res/{model_name}/perfect_list.json"))
+        accumulated[model_name] = (accumulator, perfect_matches)
+    return accumulated
 
-    total_rouge_score = {
-        "rouge-1": {
-            "recall": 0,
-            "precision": 0,
-            "fmeasure": 0,
-        },
-        "rouge-2": {
-            "recall": 0,
-            "precision": 0,
-            "fmeasure": 0,
-        },
-        "rouge-l": {
-            "recall": 0,
-            "precision": 0,
-            "fmeasure": 0,
-        },
-    }
-    
-    total_bleu_score = {
-        "bleu": 0,
-        "bleu_1": 0,
-        "bleu_2": 0,
-        "bleu_3": 0,
-        "bleu_4": 0,
-    }
 
-    cosine_similarity = 0
+def parseValidLength(value):
+    return value if value == "auto" else int(value)
 
-    for item in evaluation_res:
-        if item["success"] == True:
-            total_rouge_score["rouge-1"]["recall"] += item["rouge_score"]["rouge-1"]["recall"]
-            total_rouge_score["rouge-1"]["precision"] += item["rouge_score"]["rouge-1"]["precision"]
-            total_rouge_score["rouge-1"]["fmeasure"] += item["rouge_score"]["rouge-1"]["fmeasure"]
 
-            total_rouge_score["rouge-2"]["recall"] += item["rouge_score"]["rouge-2"]["recall"]
-            total_rouge_score["rouge-2"]["precision"] += item["rouge_score"]["rouge-2"]["precision"]
-            total_rouge_score["rouge-2"]["fmeasure"] += item["rouge_score"]["rouge-2"]["fmeasure"]
+def resolveValidLength(valid_length):
+    return deriveValidLength() if valid_length == "auto" else valid_length
 
-            total_rouge_score["rouge-l"]["recall"] += item["rouge_score"]["rouge-l"]["recall"]
-            total_rouge_score["rouge-l"]["precision"] += item["rouge_score"]["rouge-l"]["precision"]
-            total_rouge_score["rouge-l"]["fmeasure"] += item["rouge_score"]["rouge-l"]["fmeasure"]
 
-            total_bleu_score["bleu"] += item["bleu_score"]["bleu"]
-            total_bleu_score["bleu_1"] += item["bleu_score"]["bleu_1"]
-            total_bleu_score["bleu_2"] += item["bleu_score"]["bleu_2"]
-            total_bleu_score["bleu_3"] += item["bleu_score"]["bleu_3"]
-            total_bleu_score["bleu_4"] += item["bleu_score"]["bleu_4"]
+def evaluateModel(model_name, valid_length=VALID_LENGTH, accumulated=None):
+    if accumulated is None:
+        accumulated = accumulateModels([model_name])
+    valid_length = resolveValidLength(valid_length)
 
-            cosine_similarity += item["cosine_similarity"]
+    accumulator, perfect_matches = accumulated[model_name]
+    total_rouge_score, total_bleu_score, cosine_similarity = accumulator.result()
 
-    perfect_matches = len(perfect_list)
 
     average_rouge_score = {
         "rouge-1": {
@@ -166,8 +227,11 @@ def generateMarkdown(results):
     
     return md
 
-def evaluateAll():
-    results = [evaluateModel(model) for model in ALL_MODELS]
+def evaluateAll(valid_length=VALID_LENGTH):
+    # 每个模型的结果文件只读取一次
+    accumulated = accumulateModels(ALL_MODELS)
+    valid_length = resolveValidLength(valid_length)
+    results = [evaluateModel(model, valid_length, accumulated) for model in ALL_MODELS]
     
     # Print table
     print("\n=== Evaluation Results Table ===")
@@ -187,6 +251,8 @@ def evaluateAll():
 def main():
     parser = argparse.ArgumentParser(description='Evaluate model performance')
     parser.add_argument('model', nargs='?', help='Model name to evaluate')
+    parser.add_argument('--valid_length', type=parseValidLength, default=VALID_LENGTH,
+                        help=f'Denominator of the averages (default: {VALID_LENGTH}, as in the published results); auto counts the successful cases of ./data/res/baseline.jsonl')
     args = parser.parse_args()
     
     if args.model:
@@ -196,7 +262,7 @@ def main():
             print("Available models:", ", ".join(ALL_MODELS))
             sys.exit(1)
         
-        result = evaluateModel(args.model)
+        result = evaluateModel(args.model, args.valid_length)
         print("\n=== Single Model Evaluation Results ===")
         print(f"Model: {args.model}")
         print("\nROUGE Scores:")
@@ -213,7 +279,7 @@ def main():
         print(f"  {float(result['cosine'])*100}")
     else:
         # Evaluate all models
-        evaluateAll()
+        evaluateAll(args.valid_length)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+@File: log_similarity.py
+@Description:
+  Reusable similarity scorer for dynamic evaluation (BLEU, ROUGE-1/2/L, TF-IDF cosine).
+  The scorer keeps its BLEU metric, ROUGE tokenizer (with a memoized Porter stemmer)
+  and TF-IDF vectorizer alive for the whole run instead of rebuilding them per pair.
+"""
+
+import functools
+
+import numpy as np
+from nltk.stem import porter
+from rouge_score import rouge_scorer, tokenize, tokenizers
+from sacrebleu.metrics import BLEU
+from sklearn.base import clone
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+# Maximum number of distinct words whose Porter stem is memoized
+STEM_CACHE_SIZE = 1 << 16
+
+ROUGE_TYPES = ['rouge1', 'rouge2', 'rougeL']
+ROUGE_KEYS = {'rouge1': 'rouge-1', 'rouge2': 'rouge-2', 'rougeL': 'rouge-l'}
+
+# pair:            one TfidfVectorizer fit per pair (original behavior, the default)
+# pair_vectorized: same per-pair IDF, but one shared vocabulary and one sparse pass over all pairs
+# corpus:          vocabulary and IDF fit once over every document of the batch
+COSINE_MODES = ['pair', 'pair_vectorized', 'corpus']
+
+# Smoothed IDF of a term that occurs in only one of the two documents of a pair:
+# ln((1 + n) / (1 + df)) + 1 with n = 2, df = 1. A term in both documents gets exactly 1.
+PAIR_SINGLE_IDF = np.log(3 / 2) + 1
+
+
+def _row_sum(matrix):
+    return np.asarray(matrix.sum(axis=1)).ravel()
+
+
+def _row_cosine(left, right):
+    """Row-wise cosine of two sparse matrices with the same shape, 0 for empty rows."""
+    dot = _row_sum(left.multiply(right))
+    norm = np.sqrt(_row_sum(left.multiply(left))) * np.sqrt(_row_sum(right.multiply(right)))
+    cosine = np.zeros(len(dot))
+    np.divide(dot, norm, out=cosine, where=norm > 0)
+    return cosine
+
+
+def pair_tfidf_cosine(reference_counts, candidate_counts):
+    """
+    Cosine of TfidfVectorizer().fit_transform([reference, candidate]) computed from the
+    term counts of the two documents, 0 when neither document has a token.
+    """
+    def weights(counts, other):
+        return {term: count * (1 if term in other else PAIR_SINGLE_IDF) for term, count in counts.items()}
+
+    reference_weights = weights(reference_counts, candidate_counts)
+    candidate_weights = weights(candidate_counts, reference_counts)
+    dot = sum(weight * candidate_weights[term] for term, weight in reference_weights.items() if term in candidate_weights)
+    norm = np.sqrt(sum(w * w for w in reference_weights.values())) * np.sqrt(sum(w * w for w in candidate_weights.values()))
+    return float(dot / norm) if norm > 0 else 0.0
+
+
+class MemoizedStemmer:
+    """Porter stemmer whose stem() results are cached, log files repeat the same words a lot."""
+
+    def __init__(self, cache_size=STEM_CACHE_SIZE):
+        self._stemmer = porter.PorterStemmer()
+        self.stem = functools.lru_cache(maxsize=cache_size)(self._stemmer.stem)
+
+
+class StemmingTokenizer(tokenizers.Tokenizer):
+    """Same tokenization as RougeScorer(use_stemmer=True), backed by a MemoizedStemmer."""
+
+    def __init__(self, cache_size=STEM_CACHE_SIZE):
+        self._stemmer = MemoizedStemmer(cache_size)
+
+    def tokenize(self, text):
+        return tokenize.tokenize(text, self._stemmer)
+
+
+class LogSimilarityScorer:
+    """
+    Long-lived scorer, create it once per process and call score()/score_batch()
+    for every (reference, candidate) pair.
+    """
+
+    def __init__(self, stem_cache_size=STEM_CACHE_SIZE):
+        self.tokenizer = StemmingTokenizer(stem_cache_size)
+        self.rouge_scorer = rouge_scorer.RougeScorer(ROUGE_TYPES, tokenizer=self.tokenizer)
+        # Same settings as sacrebleu.sentence_bleu(..., smooth_method='none')
+        self.bleu_metric = BLEU(smooth_method='none', effective_order=True)
+        self.vectorizer = TfidfVectorizer()
+
+    def bleu(self, reference, candidate):
+        # The argument order matches the original sentence_bleu(reference, [candidate]) call
+        bleu = self.bleu_metric.sentence_score(reference, [candidate])
+        return {
+            'bleu': bleu.score,
+            'bleu_1': bleu.precisions[0],
+            'bleu_2': bleu.precisions[1],
+            'bleu_3': bleu.precisions[2],
+            'bleu_4': bleu.precisions[3]
+        }
+
+    def rouge(self, reference, candidate):
+        scores = self.rouge_scorer.score(reference, candidate)
+        return {
+            ROUGE_KEYS[rouge_type]: {
+                'recall': scores[rouge_type].recall,
+                'precision': scores[rouge_type].precision,
+                'fmeasure': scores[rouge_type].fmeasure
+            }
+            for rouge_type in ROUGE_TYPES
+        }
+
+    def cosine(self, reference, candidate):
+        # fit_transform refits the vocabulary and IDF, so every pair keeps its own two-document model
+        tfidf_matrix = self.vectorizer.fit_transform([reference, candidate])
+        return cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+
+    def cosine_batch(self, references, candidates, mode='pair'):
+        """
+        TF-IDF cosine of every (references[i], candidates[i]) pair, see COSINE_MODES.
+        The vectorized modes compute all rows with a few sparse matrix operations.
+        """
+        if mode not in COSINE_MODES:
+            raise ValueError(f"Unknown cosine mode: {mode}")
+        n = len(references)
+        if mode == 'pair':
+            return np.array([self.cosine(reference, candidate) for reference, candidate in zip(references, candidates)])
+        if n == 0:
+            return np.zeros(0)
+
+        documents = list(references) + list(candidates)
+        try:
+            if mode == 'corpus':
+                # Rows are already l2-normalized by the vectorizer
+                tfidf_matrix = clone(self.vectorizer).fit_transform(documents)
+                return _row_sum(tfidf_matrix[:n].multiply(tfidf_matrix[n:]))
+            counts = CountVectorizer(analyzer=self.vectorizer.build_analyzer()).fit_transform(documents)
+        except ValueError:
+            # Empty vocabulary: no document of the batch contains a token
+            return np.zeros(n)
+
+        reference_tf = counts[:n].astype(np.float64)
+        candidate_tf = counts[n:].astype(np.float64)
+        # Down-weight the terms that each row shares with its partner from PAIR_SINGLE_IDF to 1
+        reference_tfidf = reference_tf * PAIR_SINGLE_IDF - reference_tf.multiply(candidate_tf > 0) * (PAIR_SINGLE_IDF - 1)
+        candidate_tfidf = candidate_tf * PAIR_SINGLE_IDF - candidate_tf.multiply(reference_tf > 0) * (PAIR_SINGLE_IDF - 1)
+        return _row_cosine(reference_tfidf, candidate_tfidf)
+
+    def score(self, reference, candidate):
+        return {
+            'bleu_score': self.bleu(reference, candidate),
+            'rouge_score': self.rouge(reference, candidate),
+            'cosine_similarity': self.cosine(reference, candidate)
+        }
+
+    def score_batch(self, pairs, cosine_mode='pair'):
+        """Score a list of (reference, candidate) pairs, results keep the input order."""
+        references = [reference for reference, _ in pairs]
+        candidates = [candidate for _, candidate in pairs]
+        cosines = self.cosine_batch(references, candidates, cosine_mode)
+        return [
+            {
+                'bleu_score': self.bleu(reference, candidate),
+                'rouge_score': self.rouge(reference, candidate),
+                'cosine_similarity': cosine
+            }
+            for reference, candidate, cosine in zip(references, candidates, cosines)
+        ]
+
+
+_default_scorer = None
+
+
+def get_scorer():
+    """Return the scorer shared by the current process, creating it on first use."""
+    global _default_scorer
+    if _default_scorer is None:
+        _default_scorer = LogSimilarityScorer()
+    return _default_scorer
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+@File: metric_cache.py
+@Description:
+  Persistent cache of per-case similarity scores for dynamic evaluation. Entries are keyed by
+  (baseline log hash, prediction log hash, metric config), so a re-run only scores pairs whose
+  logs or scoring settings changed. Stored in SQLite, least recently used entries are evicted
+  once the cache holds more than max_entries scores.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from importlib import metadata
+
+# Bump when the scoring code changes in a way that changes the numbers
+METRIC_CONFIG_VERSION = 1
+DEFAULT_MAX_ENTRIES = 1000000
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def metric_config(**options):
+    """Describe the scoring settings of one case, the metric libraries' versions are always included."""
+    config = {
+        'version': METRIC_CONFIG_VERSION,
+        'sacrebleu': _package_version('sacrebleu'),
+        'rouge-score': _package_version('rouge-score'),
+        'scikit-learn': _package_version('scikit-learn'),
+    }
+    config.update(options)
+    return json.dumps(config, sort_keys=True)
+
+
+class MetricCache:
+    """SQLite-backed score cache, safe to share between the model threads of eval_res."""
+
+    def __init__(self, db_path, max_entries=DEFAULT_MAX_ENTRIES):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._file_hashes = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS metric_cache ('
+            'key TEXT PRIMARY KEY, score TEXT NOT NULL, last_used REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS metric_cache_last_used ON metric_cache (last_used)')
+        self._conn.commit()
+
+    def file_hash(self, file_path):
+        """sha256 of a log file, memoized per (path, size, mtime) for the lifetime of the cache."""
+        stat = os.stat(file_path)
+        memo_key = (file_path, stat.st_size, stat.st_mtime_ns)
+        digest = self._file_hashes.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            self._file_hashes[memo_key] = digest
+        return digest
+
+    def make_key(self, baseline_path, prediction_path, config):
+        key = '\0'.join([self.file_hash(baseline_path), self.file_hash(prediction_path), config])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """Return the cached score of every key in order, None for misses."""
+        scores = {}
+        now = time.time()
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, score FROM metric_cache WHERE key IN ({','.join('?' * len(batch))})", batch)
+                scores.update((key, json.loads(score)) for key, score in rows)
+            self._conn.executemany('UPDATE metric_cache SET last_used = ? WHERE key = ?',
+                                   [(now, key) for key in scores])
+            self._conn.commit()
+        return [scores.get(key) for key in keys]
+
+    def put_many(self, items):
+        """Store (key, score) pairs."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO metric_cache (key, score, last_used) VALUES (?, ?, ?)',
+                                   [(key, json.dumps(score), now) for key, score in items])
+            self._conn.commit()
+
+    def evict(self):
+        """Drop the least recently used entries beyond max_entries."""
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM metric_cache WHERE key IN '
+                '(SELECT key FROM metric_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+            self._conn.commit()
+
+    def close(self):
+        self.evict()
+        self._conn.close()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@File: output_log_reader.py
+@Description:
+  Memory-mapped reader for the output_logs/*.txt files written by execute_unittest.
+  The file is mapped once and a line-offset index is built over it. The text after
+  the last [SUPER TAG] of each line is yielded lazily, either as a memoryview into
+  the mapping or as a decoded string, without splitting the whole file in memory.
+"""
+
+import mmap
+import os
+from array import array
+
+SUPER_TAG = b'[SUPER TAG]'
+
+
+class OutputLogReader:
+    """
+    Line-indexed view of one output log. Line breaks follow Python text mode
+    (\\n, \\r\\n and \\r), so ''.join(reader.iter_payloads()) is the same string
+    eval_res.read_txt used to build.
+
+    Use it as a context manager. Memoryviews returned by iter_payloads(decode=False)
+    must be released before the reader is closed.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        self._line_starts = self._build_line_index()
+
+    def _build_line_index(self):
+        line_starts = array('Q', [0])
+        if self._mm is None:
+            return line_starts
+        position = self._mm.find(b'\n')
+        while position != -1:
+            line_starts.append(position + 1)
+            position = self._mm.find(b'\n', position + 1)
+        return line_starts
+
+    def __len__(self):
+        return len(self._line_starts)
+
+    def line_span(self, index):
+        """Byte range [start, end) of line index, without its trailing \\n."""
+        start = self._line_starts[index]
+        end = self._line_starts[index + 1] - 1 if index + 1 < len(self._line_starts) else self._size
+        return start, end
+
+    def _payload_spans(self):
+        mm = self._mm
+        if mm is None:
+            # read_txt('') still yields one empty line
+            yield 0, 0
+            return
+        for index in range(len(self._line_starts)):
+            start, end = self.line_span(index)
+            # A lone \r is a line break in text mode as well, \r\n only adds an empty payload
+            while True:
+                carriage_return = mm.find(b'\r', start, end)
+                line_end = end if carriage_return == -1 else carriage_return
+                tag = mm.rfind(SUPER_TAG, start, line_end)
+                yield (start if tag == -1 else tag + len(SUPER_TAG)), line_end
+                if carriage_return == -1:
+                    break
+                start = carriage_return + 1
+
+    def iter_payloads(self, decode=True):
+        """Yield the post-tag payload of every line, as str or as a memoryview when decode is False."""
+        if decode:
+            for start, end in self._payload_spans():
+                yield self._mm[start:end].decode('utf-8') if end > start else ''
+        else:
+            view = memoryview(self._mm) if self._mm is not None else memoryview(b'')
+            try:
+                for start, end in self._payload_spans():
+                    yield view[start:end]
+            finally:
+                view.release()
+
+    def text(self):
+        return ''.join(self.iter_payloads())
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+@File: record_stream.py
+@Description:
+  Incremental readers for evaluation record files. A JSON array (such as eval_res.json, written
+  with indent=2) or a JSONL file is yielded one record at a time, so memory does not grow
+  with the file size.
+"""
+
+import json
+
+READ_BLOCK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+# Characters that may follow a complete element of an array
+_ELEMENT_END = frozenset(' \t\r\n,]')
+
+
+def iter_json_array(file_path, block_size=READ_BLOCK_SIZE):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        eof = False
+        started = False
+
+        def fill():
+            nonlocal buffer, position, eof
+            block = f.read(block_size)
+            if not block:
+                eof = True
+            buffer = buffer[position:] + block
+            position = 0
+
+        while True:
+            # Skip whitespace, the opening bracket and the separators between elements
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','
+                                               or (not started and buffer[position] == '[')):
+                if buffer[position] == '[':
+                    started = True
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    raise ValueError(f"Unterminated JSON array in {file_path}")
+                fill()
+                continue
+            if not started:
+                raise ValueError(f"{file_path} does not contain a JSON array")
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element is cut off at the end of the buffer, read more of it
+                if eof:
+                    raise
+                fill()
+                continue
+            if buffer[position] not in '{["' and (end == len(buffer) or buffer[end] not in _ELEMENT_END):
+                # A number or literal cut off by the block boundary decodes as a shorter value
+                # (2.5e10 as 2 or 2.5), so it is only complete once a delimiter follows it
+                if not eof:
+                    fill()
+                    continue
+                if end < len(buffer):
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, end)
+            yield item
+            position = end
+
+
+def iter_jsonl(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_records(file_path):
+    """Yield the records of a .jsonl file, or the elements of a JSON array file."""
+    if file_path.endswith('.jsonl'):
+        return iter_jsonl(file_path)
+    return iter_json_array(file_path)
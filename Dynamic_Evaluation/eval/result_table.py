@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+@File: result_table.py
+@Description:
+  Columnar (Parquet) storage for per-uuid dynamic evaluation results. Each row is one uuid and
+  every metric is a flat column (rouge1_f, bleu_4, cosine, ...), so cross-model tables, sorting
+  and filtering become column operations. pyarrow is only needed when this format is used.
+"""
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pip install pyarrow
+    pa = pq = None
+
+ROUGE_COLUMNS = {
+    'rouge-1': 'rouge1',
+    'rouge-2': 'rouge2',
+    'rouge-l': 'rougeL'
+}
+MEASURE_COLUMNS = {
+    'recall': 'r',
+    'precision': 'p',
+    'fmeasure': 'f'
+}
+BLEU_COLUMNS = ['bleu', 'bleu_1', 'bleu_2', 'bleu_3', 'bleu_4']
+
+# (column name, path into an eval_res record)
+METRIC_COLUMNS = (
+    [(f'{ROUGE_COLUMNS[rouge_type]}_{MEASURE_COLUMNS[measure]}', ('rouge_score', rouge_type, measure))
+     for rouge_type in ROUGE_COLUMNS for measure in MEASURE_COLUMNS]
+    + [(column, ('bleu_score', column)) for column in BLEU_COLUMNS]
+    + [('cosine', ('cosine_similarity',))]
+)
+METRIC_COLUMN_NAMES = [column for column, _ in METRIC_COLUMNS]
+KEY_COLUMNS = ['uuid', 'baseline_size', 'compare_size']
+RESULT_COLUMNS = KEY_COLUMNS + METRIC_COLUMN_NAMES + ['success']
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("The parquet result format needs pyarrow, install it with: pip install pyarrow")
+
+
+def _lookup(record, path):
+    for key in path:
+        record = record[key]
+    return record
+
+
+def flatten_result(record):
+    """Turn one nested eval_res record into a flat {column: value} row."""
+    row = {column: record[column] for column in KEY_COLUMNS}
+    for column, path in METRIC_COLUMNS:
+        row[column] = float(_lookup(record, path))
+    row['success'] = bool(record['success'])
+    return row
+
+
+def write_result_table(records, file_path):
+    """Write eval_res records as a Parquet file with one row per uuid."""
+    require_pyarrow()
+    columns = {column: [] for column in RESULT_COLUMNS}
+    for record in records:
+        for column, value in flatten_result(record).items():
+            columns[column].append(value)
+    schema = pa.schema(
+        [('uuid', pa.string()), ('baseline_size', pa.int64()), ('compare_size', pa.int64())]
+        + [(column, pa.float64()) for column, _ in METRIC_COLUMNS]
+        + [('success', pa.bool_())]
+    )
+    pq.write_table(pa.Table.from_pydict(columns, schema=schema), file_path, compression='zstd')
+
+
+def read_result_table(file_path, columns=None):
+    """Read a Parquet result file, optionally only some of its columns."""
+    require_pyarrow()
+    return pq.read_table(file_path, columns=columns)
+
+
+def success_metric_matrix(file_path):
+    """(rows, metrics) array of the successful rows, columns in METRIC_COLUMN_NAMES order."""
+    table = read_result_table(file_path, METRIC_COLUMN_NAMES + ['success'])
+    success = table.column('success').to_numpy()
+    matrix = np.column_stack([table.column(column).to_numpy() for column in METRIC_COLUMN_NAMES])
+    return matrix[success]
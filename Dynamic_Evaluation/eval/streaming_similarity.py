@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+@File: streaming_similarity.py
+@Description:
+  Streaming similarity engine for output logs that are too large for whole-file scoring.
+  The [SUPER TAG] payload of a log is read in chunks. BLEU/ROUGE n-gram counts and TF-IDF
+  term counts are accumulated chunk by chunk, and ROUGE-L uses a column-blocked bit-parallel
+  LCS in linear space. BLEU and ROUGE give the same numbers as scoring the text returned by
+  eval_res.read_txt.
+"""
+
+from array import array
+from collections import Counter
+from functools import partial
+
+from rouge_score import scoring
+from sacrebleu.metrics import BLEU
+
+from log_similarity import ROUGE_KEYS, get_scorer, pair_tfidf_cosine
+from output_log_reader import OutputLogReader
+
+# Number of characters buffered before a chunk is handed to the tokenizers
+CHUNK_SIZE = 1 << 13
+BLEU_MAX_ORDER = 4
+# Tokens of the shorter sequence handled per bit-parallel LCS block. The match masks of a block
+# take at most LCS_BLOCK_SIZE ** 2 bits (8 MB), independent of the length of the logs.
+LCS_BLOCK_SIZE = 1 << 13
+
+
+def iter_payload_chunks(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Yield the same text as eval_res.read_txt(file_path), in pieces.
+    A piece always ends right before a space, so no token is split across two pieces.
+    """
+    buffer = ''
+    with OutputLogReader(file_path) as reader:
+        for payload in reader.iter_payloads():
+            buffer += payload
+            if len(buffer) < chunk_size:
+                continue
+            cut = buffer.rfind(' ')
+            if cut > 0:
+                yield buffer[:cut]
+                buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+def count_ngrams(counter, tail, tokens, max_order):
+    """
+    Add every n-gram (1 <= n <= max_order) that ends inside tokens to counter. tail holds the
+    last max_order - 1 tokens of the previous chunk, the new tail is returned.
+    """
+    sequence = tail + tokens
+    offset = len(tail)
+    for n in range(1, max_order + 1):
+        for i in range(max(0, offset - n + 1), len(sequence) - n + 1):
+            counter[tuple(sequence[i:i + n])] += 1
+    return sequence[-(max_order - 1):] if max_order > 1 else []
+
+
+def lcs_length(a, b, block_size=LCS_BLOCK_SIZE):
+    """
+    Length of the longest common subsequence of two token sequences, using the bit-parallel
+    algorithm of Hyyrö (2004) over column blocks of the shorter sequence. Each block runs the
+    whole longer sequence through a block_size-bit vector; the only state passed from one block
+    to the next is the carry of the addition for every token of the longer sequence. Memory is
+    O(len(a) + len(b) + block_size ** 2) bits, time O(len(a) * len(b) / word size).
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return 0
+    carries = bytearray(len(a))
+    zeros = 0
+    for start in range(0, len(b), block_size):
+        block = b[start:start + block_size]
+        match_masks = {}
+        for i, token in enumerate(block):
+            match_masks[token] = match_masks.get(token, 0) | (1 << i)
+        width = len(block)
+        full = (1 << width) - 1
+        v = full
+        for j, token in enumerate(a):
+            mask = match_masks.get(token)
+            carry = carries[j]
+            if mask is None:
+                if not carry:
+                    continue
+                u = 0
+            else:
+                u = v & mask
+            total = v + u + carry
+            carries[j] = total >> width
+            # u is a subset of v, so v - u has no borrow and stays inside the block
+            v = (total | (v - u)) & full
+        zeros += width - bin(v).count('1')
+    return zeros
+
+
+def uncached_tokenizer(tokenizer):
+    """
+    The tokenizer without sacrebleu's lru_cache on __call__. Its size is a number of entries,
+    so memoizing log chunks could keep gigabytes of them alive in every worker.
+    """
+    wrapped = getattr(type(tokenizer).__call__, '__wrapped__', None)
+    return partial(wrapped, tokenizer) if wrapped is not None else tokenizer
+
+
+class LogStreamStats:
+    """Token statistics of one output log, collected chunk by chunk."""
+
+    def __init__(self, vocab, scorer):
+        # vocab interns ROUGE tokens to ints, it is shared by the two logs of a pair
+        self.vocab = vocab
+        self.scorer = scorer
+        self.analyzer = scorer.vectorizer.build_analyzer()
+        self.bleu_tokenizer = uncached_tokenizer(scorer.bleu_metric.tokenizer)
+        self.bleu_ngrams = Counter()
+        self.bleu_length = 0
+        self.rouge_unigrams = Counter()
+        self.rouge_bigrams = Counter()
+        self.rouge_tokens = array('l')
+        self.tfidf_counts = Counter()
+        self._bleu_tail = []
+        self._rouge_tail = []
+
+    def update(self, chunk):
+        scorer = self.scorer
+        bleu_tokens = self.bleu_tokenizer(chunk).split()
+        self.bleu_length += len(bleu_tokens)
+        self._bleu_tail = count_ngrams(self.bleu_ngrams, self._bleu_tail, bleu_tokens, BLEU_MAX_ORDER)
+
+        rouge_tokens = scorer.tokenizer.tokenize(chunk)
+        for token in rouge_tokens:
+            self.rouge_tokens.append(self.vocab.setdefault(token, len(self.vocab)))
+        self.rouge_unigrams.update((token,) for token in rouge_tokens)
+        sequence = self._rouge_tail + rouge_tokens
+        self.rouge_bigrams.update(zip(sequence, sequence[1:]))
+        self._rouge_tail = sequence[-1:]
+
+        self.tfidf_counts.update(self.analyzer(chunk))
+
+    @classmethod
+    def from_file(cls, file_path, vocab, scorer, chunk_size=CHUNK_SIZE):
+        stats = cls(vocab, scorer)
+        for chunk in iter_payload_chunks(file_path, chunk_size):
+            stats.update(chunk)
+        return stats
+
+
+def _rouge_ngram_score(target_ngrams, prediction_ngrams):
+    # Same arithmetic as rouge_score.rouge_scorer._score_ngrams
+    overlap = sum(min(count, prediction_ngrams[ngram]) for ngram, count in target_ngrams.items())
+    precision = overlap / max(sum(prediction_ngrams.values()), 1)
+    recall = overlap / max(sum(target_ngrams.values()), 1)
+    return precision, recall
+
+
+def _rouge_lcs_score(target_tokens, prediction_tokens):
+    # Same arithmetic as rouge_score.rouge_scorer._score_lcs
+    if not target_tokens or not prediction_tokens:
+        return 0, 0
+    lcs = lcs_length(target_tokens, prediction_tokens)
+    return lcs / len(prediction_tokens), lcs / len(target_tokens)
+
+
+def stream_score_files(reference_path, candidate_path, chunk_size=CHUNK_SIZE):
+    """
+    Score two output logs without loading either of them as one string. The result has the
+    same layout as LogSimilarityScorer.score(read_txt(reference_path), read_txt(candidate_path)).
+    """
+    scorer = get_scorer()
+    vocab = {}
+    reference = LogStreamStats.from_file(reference_path, vocab, scorer, chunk_size)
+    candidate = LogStreamStats.from_file(candidate_path, vocab, scorer, chunk_size)
+
+    # BLEU: the baseline log is the sacrebleu hypothesis, as in LogSimilarityScorer.bleu
+    correct = [0] * BLEU_MAX_ORDER
+    total = [0] * BLEU_MAX_ORDER
+    for ngram, count in reference.bleu_ngrams.items():
+        correct[len(ngram) - 1] += min(count, candidate.bleu_ngrams[ngram])
+        total[len(ngram) - 1] += count
+    bleu = BLEU.compute_bleu(correct, total, reference.bleu_length, candidate.bleu_length,
+                             smooth_method='none', effective_order=True)
+
+    rouge_precision_recall = {
+        'rouge1': _rouge_ngram_score(reference.rouge_unigrams, candidate.rouge_unigrams),
+        'rouge2': _rouge_ngram_score(reference.rouge_bigrams, candidate.rouge_bigrams),
+        'rougeL': _rouge_lcs_score(reference.rouge_tokens, candidate.rouge_tokens)
+    }
+
+    return {
+        'bleu_score': {
+            'bleu': bleu.score,
+            'bleu_1': bleu.precisions[0],
+            'bleu_2': bleu.precisions[1],
+            'bleu_3': bleu.precisions[2],
+            'bleu_4': bleu.precisions[3]
+        },
+        'rouge_score': {
+            ROUGE_KEYS[rouge_type]: {
+                'recall': recall,
+                'precision': precision,
+                'fmeasure': scoring.fmeasure(precision, recall)
+            }
+            for rouge_type, (precision, recall) in rouge_precision_recall.items()
+        },
+        'cosine_similarity': pair_tfidf_cosine(reference.tfidf_counts, candidate.tfidf_counts)
+    }
@@ -0,0 +1,150 @@
+"""
+BLEU engine shared by the FastLog and UniLog static evaluators.
+
+Every segment is tokenized and its 1..4-gram counts built once, memoized by its text, so a
+sentence score and the corpus statistics of the same pair come from one pass. Two scorings are
+provided, each matching the library the evaluators used before:
+
+- sentence_bleu scores like sacrebleu.sentence_bleu(hypothesis, references, smooth_method='none')
+  (13a tokenization, effective order) and returns sacrebleu's BLEUScore.
+- CorpusBleu accumulates the statistics of nltk corpus_bleu (whitespace tokens, no smoothing) and
+  scores any number of weightings from them. Accumulators of different shards can be merged.
+"""
+
+import math
+import sys
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from sacrebleu.metrics import BLEU
+from sacrebleu.tokenizers.tokenizer_13a import Tokenizer13a
+
+MAX_ORDER = 4
+SEGMENT_CACHE_SIZE = 1 << 16
+
+# Corpus weightings reported by the evaluators, same order as their BLEU-A/1/2/3/4 columns
+CORPUS_WEIGHTS = {
+    'bleu-A': (0.25, 0.25, 0.25, 0.25),
+    'bleu-1': (1, 0, 0, 0),
+    'bleu-2': (0, 1, 0, 0),
+    'bleu-3': (0, 0, 1, 0),
+    'bleu-4': (0, 0, 0, 1),
+}
+
+_tokenize_13a = Tokenizer13a()
+
+# A tokenized segment and the counts of its 1..MAX_ORDER-grams
+Segment = namedtuple('Segment', ['tokens', 'counts'])
+
+
+def count_ngrams(tokens, max_order=MAX_ORDER):
+    """Counts of all 1..max_order-grams of tokens, keyed by token tuples."""
+    counts = Counter()
+    for n in range(1, max_order + 1):
+        counts.update(zip(*[tokens[i:] for i in range(n)]))
+    return counts
+
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def sacrebleu_segment(text):
+    """Segment of text under sacrebleu's default 13a tokenization."""
+    tokens = _tokenize_13a(text.rstrip()).split()
+    return Segment(tokens, count_ngrams(tokens))
+
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def whitespace_segment(text):
+    """Segment of text split on whitespace, as my_corpus_bleu tokenizes it."""
+    tokens = text.strip().split()
+    return Segment(tokens, count_ngrams(tokens))
+
+
+def _merge_references(references):
+    if len(references) == 1:
+        return references[0].counts, [len(references[0].tokens)]
+    merged = Counter(references[0].counts)
+    for reference in references[1:]:
+        for ngram, count in reference.counts.items():
+            if count > merged[ngram]:
+                merged[ngram] = count
+    return merged, [len(reference.tokens) for reference in references]
+
+
+def _closest_length(hypothesis_length, reference_lengths):
+    # Ties go to the shorter reference in both sacrebleu and nltk
+    return min(reference_lengths, key=lambda length: (abs(length - hypothesis_length), length))
+
+
+def _clipped_counts(hypothesis_counts, reference_counts, max_order):
+    correct = [0] * max_order
+    total = [0] * max_order
+    for ngram, count in hypothesis_counts.items():
+        n = len(ngram) - 1
+        total[n] += count
+        reference_count = reference_counts.get(ngram)
+        if reference_count:
+            correct[n] += min(count, reference_count)
+    return correct, total
+
+
+def sentence_bleu(hypothesis, references):
+    """sacrebleu.sentence_bleu(hypothesis, references, smooth_method='none') from cached segments."""
+    hypothesis = sacrebleu_segment(hypothesis)
+    hypothesis_length = len(hypothesis.tokens)
+    reference_counts, reference_lengths = _merge_references([sacrebleu_segment(ref) for ref in references])
+    correct, total = _clipped_counts(hypothesis.counts, reference_counts, MAX_ORDER)
+    return BLEU.compute_bleu(correct, total, hypothesis_length, _closest_length(hypothesis_length, reference_lengths),
+                             smooth_method='none', effective_order=True, max_ngram_order=MAX_ORDER)
+
+
+class CorpusBleu:
+    """Running nltk corpus_bleu statistics over whitespace-tokenized segments."""
+
+    def __init__(self, max_order=MAX_ORDER):
+        self.max_order = max_order
+        self.numerators = [0] * max_order
+        self.denominators = [0] * max_order
+        self.hypothesis_length = 0
+        self.reference_length = 0
+
+    def add(self, hypothesis, references):
+        """Add one hypothesis string and its list of reference strings."""
+        hypothesis = whitespace_segment(hypothesis)
+        hypothesis_length = len(hypothesis.tokens)
+        reference_counts, reference_lengths = _merge_references([whitespace_segment(ref) for ref in references])
+        correct, total = _clipped_counts(hypothesis.counts, reference_counts, self.max_order)
+        for n in range(self.max_order):
+            self.numerators[n] += correct[n]
+            # nltk counts an empty n-gram order as one missed n-gram
+            self.denominators[n] += max(1, total[n])
+        self.hypothesis_length += hypothesis_length
+        self.reference_length += _closest_length(hypothesis_length, reference_lengths)
+
+    def merge(self, other):
+        for n in range(self.max_order):
+            self.numerators[n] += other.numerators[n]
+            self.denominators[n] += other.denominators[n]
+        self.hypothesis_length += other.hypothesis_length
+        self.reference_length += other.reference_length
+        return self
+
+    def brevity_penalty(self):
+        if self.hypothesis_length > self.reference_length:
+            return 1
+        if self.hypothesis_length == 0:
+            return 0
+        return math.exp(1 - self.reference_length / self.hypothesis_length)
+
+    def score(self, weights=CORPUS_WEIGHTS['bleu-A']):
+        """Corpus BLEU in [0, 1] for one weighting, as nltk corpus_bleu computes it."""
+        if self.numerators[0] == 0:
+            return 0
+        # nltk's method0 smoothing: a zero precision becomes the smallest positive float
+        precisions = [numerator / denominator if numerator != 0 else sys.float_info.min
+                      for numerator, denominator in zip(self.numerators, self.denominators)]
+        log_sum = math.fsum(weight * math.log(precision) for weight, precision in zip(weights, precisions))
+        return self.brevity_penalty() * math.exp(log_sum)
+
+    def scores(self, weights=CORPUS_WEIGHTS):
+        """{name: corpus BLEU} for a dict of named weightings."""
+        return {name: self.score(weight) for name, weight in weights.items()}
@@ -0,0 +1,69 @@
+"""
+Dynamic-expression tokenizer shared by the FastLog and UniLog static evaluators.
+
+extract_min_expression splits the dynamic part of a log message into variables and minimal
+operator expressions (a + b, a == b, a ? b : c, ...). The eight expression patterns are compiled
+once at import time into a single alternation, so a message is scanned once instead of eight times.
+"""
+
+import re
+from functools import lru_cache
+
+# Order matters: expressions are returned grouped by pattern, in this order
+EXPRESSION_PATTERNS = [
+    ('plus', r'\b[a-zA-Z]+\s?\+\s?[a-zA-Z]+\b'),
+    ('minus', r'\b[a-zA-Z]+\s?\-\s?[a-zA-Z]+\b'),
+    ('multi', r'\b[a-zA-Z]+\s?\*\s?[a-zA-Z]+\b'),
+    ('div', r'\b[a-zA-Z]+\s?/\s?[a-zA-Z]+\b'),
+    ('mod', r'\b[a-zA-Z]+\s?%\s?[a-zA-Z]+\b'),
+    ('equal', r'\b[a-zA-Z]+\s?==\s?[a-zA-Z]+\b'),
+    ('not_equal', r'\b[a-zA-Z]+\s?!=\s?[a-zA-Z]+\b'),
+    ('condition', r'\b[a-zA-Z]+\s?\?\s?[a-zA-Z]+\s?:\s?[a-zA-Z]+\b'),
+]
+# The alternation sits in a lookahead so that expressions of different patterns may overlap
+# (a + b - c holds both a + b and b - c). The operator always directly follows the leading word,
+# so at most one pattern matches at a given position and m.lastgroup names it. The first
+# lookahead skips every word not followed by an operator character before trying the patterns.
+EXPRESSION_SCAN = re.compile(r'\b(?=[a-zA-Z]+\s?[-+*/%=!?])(?='
+                             + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in EXPRESSION_PATTERNS) + ')')
+PATTERN_ORDER = {name: index for index, (name, _) in enumerate(EXPRESSION_PATTERNS)}
+HAS_LETTER = re.compile(r'[a-zA-Z]')
+
+EXPRESSION_CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _extract_min_expression(vars):
+    found, ends = [], {}
+    for m in EXPRESSION_SCAN.finditer(vars):
+        name = m.lastgroup
+        # Like findall, matches of the same pattern never overlap
+        if m.start() >= ends.get(name, 0):
+            found.append((PATTERN_ORDER[name], m.group(name)))
+            ends[name] = m.end(name)
+    # A stable sort groups the expressions by pattern and keeps each pattern's matches in order
+    min_expression = [exp for _, exp in sorted(found, key=lambda item: item[0])]
+
+    # 消除掉 vars 中的表达式，剩下的就是单独的变量
+    for exp in min_expression:
+        vars = vars.replace(exp, "")
+    variables = [var for var in vars.split(' ') if HAS_LETTER.search(var)]
+    variables.extend(min_expression)
+    return tuple(variables)
+
+
+def extract_min_expression(vars):
+    """Variables and minimal expressions of the dynamic part of a message, as a new list."""
+    if vars == None or vars == '':
+        return []
+    return list(_extract_min_expression(vars))
+
+
+def extract_min_expression_batch(messages):
+    """
+    extract_min_expression over a list or a pandas Series of messages. A Series gives back a
+    Series with the same index, anything else a list.
+    """
+    if hasattr(messages, 'map') and hasattr(messages, 'index'):
+        return messages.map(extract_min_expression)
+    return [extract_min_expression(message) for message in messages]
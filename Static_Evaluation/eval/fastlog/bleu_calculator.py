@@ -1,68 +1,71 @@
-from nltk.translate.bleu_score import corpus_bleu
-from nltk.translate.bleu_score import sentence_bleu
+import os
+import sys
 
-from sacrebleu import sentence_bleu
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bleu_engine import CORPUS_WEIGHTS, CorpusBleu, sentence_bleu
 
 
-def my_sentence_bleu(candidate_list, reference_list):
-    bleu1_sum = bleu2_sum = bleu3_sum = bleu4_sum = bleuA_sum = 0
+def _sentence_scores(ref, cand):
+    if cand == '':
+        return 0, 0, 0, 0, 0
+    # bleu1_score = sentence_bleu([tokens_real], tokens_pred, weights=(1.0, 0.0, 0.0, 0.0))
+    # bleu2_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.0, 1.0, 0.0, 0.0))
+    # bleu3_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.0, 0.0, 1.0, 0.0))
+    # bleu4_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.0, 0.0, 0.0, 1.0))
+    # bleuA_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.25, 0.25, 0.25, 0.25))
+    bleu = sentence_bleu(ref, [cand])
+    return bleu.score, bleu.precisions[0], bleu.precisions[1], bleu.precisions[2], bleu.precisions[3]
 
-    for (ref, cand) in zip(reference_list, candidate_list):
 
-        tokens_real = ref.split(' ')
-        tokens_pred = cand.split(' ')
-
-        if cand == '':
-            bleu1_score = bleu2_score = bleu3_score = bleu4_score = bleuA_score = 0
-
-        else:
-            # bleu1_score = sentence_bleu([tokens_real], tokens_pred, weights=(1.0, 0.0, 0.0, 0.0))
-            # bleu2_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.0, 1.0, 0.0, 0.0))
-            # bleu3_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.0, 0.0, 1.0, 0.0))
-            # bleu4_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.0, 0.0, 0.0, 1.0))
-            # bleuA_score = sentence_bleu([tokens_real], tokens_pred, weights=(0.25, 0.25, 0.25, 0.25))
-            bleu = sentence_bleu(ref, [cand], smooth_method='none')
-            bleu1_score = bleu.precisions[0]
-            bleu2_score = bleu.precisions[1]
-            bleu3_score = bleu.precisions[2]
-            bleu4_score = bleu.precisions[3]
-            bleuA_score = bleu.score
-
-        bleu1_sum += bleu1_score
-        bleu2_sum += bleu2_score
-        bleu3_sum += bleu3_score
-        bleu4_sum += bleu4_score
-        bleuA_sum += bleuA_score
-
-    output = 'BLEU_[A-1-2-3-4]: {}/{}/{}/{}/{}'.format(
-        round(bleuA_sum / len(reference_list), 3),
-        round(bleu1_sum / len(reference_list), 3),
-        round(bleu2_sum / len(reference_list), 3),
-        round(bleu3_sum / len(reference_list), 3),
-        round(bleu4_sum / len(reference_list), 3)
-    )
+def _print_sentence_bleu(sums, count):
+    output = 'BLEU_[A-1-2-3-4]: {}/{}/{}/{}/{}'.format(*[round(total / count, 3) for total in sums])
     print(output)
 
 
-def my_corpus_bleu(preds, refs, verbose=False):
-    refs = [[ref.strip().split()] for ref in refs]
-    preds = [pred.strip().split() for pred in preds]
-    print(preds[0])
-    print(refs[0])
-
-    Ba = corpus_bleu(refs, preds)
-
+def _print_corpus_bleu(corpus):
     def r(B):
         return round(B * 100, 4)
 
+    scores = corpus.scores()
+    print('BLEU: {:.4f}\tB1: {:.4f}\tB2: {:.4f}\tB3: {:.4f}\tB4: {:.4f}'.format(
+        r(scores['bleu-A']), r(scores['bleu-1']), r(scores['bleu-2']), r(scores['bleu-3']), r(scores['bleu-4'])))
+
+
+def my_sentence_bleu(candidate_list, reference_list):
+    sums = [0] * 5
+    for (ref, cand) in zip(reference_list, candidate_list):
+        for i, score in enumerate(_sentence_scores(ref, cand)):
+            sums[i] += score
+    _print_sentence_bleu(sums, len(reference_list))
+
+
+def my_corpus_bleu(preds, refs, verbose=False):
+    print(preds[0].strip().split())
+    print([refs[0].strip().split()])
+
+    corpus = CorpusBleu()
+    for pred, ref in zip(preds, refs):
+        corpus.add(pred, [ref])
+
     if verbose:
-        B1 = corpus_bleu(refs, preds, weights=(1, 0, 0, 0))
-        B2 = corpus_bleu(refs, preds, weights=(0, 1, 0, 0))
-        B3 = corpus_bleu(refs, preds, weights=(0, 0, 1, 0))
-        B4 = corpus_bleu(refs, preds, weights=(0, 0, 0, 1))
-        print('BLEU: {:.4f}\tB1: {:.4f}\tB2: {:.4f}\tB3: {:.4f}\tB4: {:.4f}'.format(r(Ba), r(B1), r(B2), r(B3), r(B4)))
+        _print_corpus_bleu(corpus)
+
+    return corpus.score(CORPUS_WEIGHTS['bleu-A'])
 
-    return Ba
 
+def my_bleu(candidate_list, reference_list, verbose=False):
+    """my_sentence_bleu followed by my_corpus_bleu, with both computed in one pass over the pairs."""
+    sums = [0] * 5
+    corpus = CorpusBleu()
+    for (ref, cand) in zip(reference_list, candidate_list):
+        for i, score in enumerate(_sentence_scores(ref, cand)):
+            sums[i] += score
+        corpus.add(cand, [ref])
 
+    _print_sentence_bleu(sums, len(reference_list))
+    print(candidate_list[0].strip().split())
+    print([reference_list[0].strip().split()])
+    if verbose:
+        _print_corpus_bleu(corpus)
 
+    return corpus.score(CORPUS_WEIGHTS['bleu-A'])
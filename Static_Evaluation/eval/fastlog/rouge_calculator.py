@@ -1,4 +1,8 @@
-from rouge import Rouge
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rouge_engine import RougeEngine
 
 
 def r(x):
@@ -6,7 +10,7 @@ def r(x):
 
 
 def cal_rouge(hypotheses, references):
-    rouge = Rouge()
+    rouge = RougeEngine()
     avg_score = rouge.get_scores(hypotheses, references, avg=True, ignore_empty=True)
     print('rouge-1: {:.4}\t\trouge-2: {:.4}\t\trouge-l: {:.4}'.format(r(avg_score['rouge-1']['f']),
                                                                       r(avg_score['rouge-2']['f']),
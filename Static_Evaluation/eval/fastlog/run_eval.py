@@ -1,176 +1,169 @@
 import pandas as pd
-import re
+import numpy as np
+import os
+import sys
+from dataclasses import dataclass, field
 
-from bleu_calculator import my_corpus_bleu, my_sentence_bleu
+from bleu_calculator import my_bleu
 from rouge_calculator import cal_rouge
 
-def extract_min_expression(vars):
-    if vars == None or vars == '':
-        return []
-    pattern_plus = re.compile(r'\b[a-zA-Z]+\s?\+\s?[a-zA-Z]+\b')
-    pattern_minus = re.compile(r'\b[a-zA-Z]+\s?\-\s?[a-zA-Z]+\b')
-    pattern_multi = re.compile(r'\b[a-zA-Z]+\s?\*\s?[a-zA-Z]+\b')
-    pattern_div = re.compile(r'\b[a-zA-Z]+\s?/\s?[a-zA-Z]+\b')
-    pattern_mod = re.compile(r'\b[a-zA-Z]+\s?%\s?[a-zA-Z]+\b')
-    pattern_equal = re.compile(r'\b[a-zA-Z]+\s?==\s?[a-zA-Z]+\b')
-    pattern_not_equal = re.compile(r'\b[a-zA-Z]+\s?!=\s?[a-zA-Z]+\b')
-    pattern_condition = re.compile(r'\b[a-zA-Z]+\s?\?\s?[a-zA-Z]+\s?:\s?[a-zA-Z]+\b')
-
-    # 从 vars 中找到上诉所有的表达式
-    min_expression = []
-    min_expression.extend(pattern_plus.findall(vars))
-    min_expression.extend(pattern_minus.findall(vars))
-    min_expression.extend(pattern_multi.findall(vars))
-    min_expression.extend(pattern_div.findall(vars))
-    min_expression.extend(pattern_mod.findall(vars))
-    min_expression.extend(pattern_equal.findall(vars))
-    min_expression.extend(pattern_not_equal.findall(vars))
-    min_expression.extend(pattern_condition.findall(vars))
-    
-    for exp in min_expression:
-        vars = vars.replace(exp, "")
-    vars = vars.split(' ')
-    vars = [var for var in vars if re.search(r'[a-zA-Z]', var)]
-
-    vars.extend(min_expression)
-    return vars
-
-
-def cal_position_metrics(prediction_file, label_file):
-    print("Evaluate log position...")
-    correct_class = 1
-    predictions = pd.read_csv(prediction_file)["Position"]
-    target_labels = pd.read_csv(label_file)["Label"]
-    targets = target_labels.apply(lambda x: [int(num) for num in x.split()].index(correct_class))
-    data = pd.DataFrame()
-    data["prediction"] = predictions
-    data["target"] = targets
-    data["match"] = data["prediction"] == data["target"]
-    print("Accuracy: {}     Correct: {}     Total: {}".format(100 * len(data[data["match"] == True]) / len(data),
-                                                              len(data[data["match"] == True]), len(data)))
-
-
-def cal_level_metrics(predict_file, label_file, position_predict_file, position_label_file):
-    print("Evaluate log level...")
-    cat_dict = {'trace': 0, 'debug': 1, 'info': 2, 'warn': 3, 'error': 4, 'fatal': 5}
-    predictions = pd.read_csv(predict_file)["Level"]
-    targets = pd.read_csv(label_file)["Level"]
-    logSta = pd.read_csv(label_file)["LogStatement"]
-    targets = targets.replace(cat_dict)
-    targets = targets.apply(lambda x: x if x in range(6) else 0)
-    target_list = targets.tolist()
-    predictions = predictions.apply(lambda x: int(x) if int(x) in range(6) else 100)
-    level_dis = {}
-    for i in range(len(target_list)):
-        dis = min(abs(target_list[i] - int(predictions[i])), 6)
-        if dis in level_dis:
-            level_dis[dis] += 1
-        else:
-            level_dis[dis] = 1
-    data_num = len(target_list)
-    print("average level distance: ", sum([(6-k)*v for k, v in level_dis.items()])/data_num)
-    print("average level shift rate: ", sum([(6-k)*v for k, v in level_dis.items()])/data_num/6)
-
-
-    data = pd.DataFrame()
-    data["prediction"] = predictions
-    data["target"] = targets
-
-    data["position_prediction"] = pd.read_csv(position_predict_file)["Position"]
-    data["position_target"] = pd.read_csv(position_label_file)["Label"].apply(lambda x: [int(num) for num in x.split()].index(1))
-
-    condition_level_acc = 0
-    for i in range(len(data)):
-        if data["position_prediction"][i] == data["position_target"][i] and data["prediction"][i] == data["target"][i]:
-            condition_level_acc += 1
-    print("Condition Level Accuracy: {}     Correct: {}     Total: {}".format(100 * condition_level_acc / len(data),
-                                                            condition_level_acc, len(data)) )
-
-    data["match"] = data["prediction"] == data["target"]
-    print("Accuracy: {}     Correct: {}     Total: {}".format(100 * len(data[data["match"] == True]) / len(data),
-                                                            len(data[data["match"] == True]), len(data)))
-
-def cal_condition_message_metrics(data):
-    condition_message_acc = 0
-    for i in range(len(data)):
-        if data["position_prediction"][i] == data["position_target"][i] and data["match"][i]:
-            condition_message_acc += 1
-    print("Condition Message Accuracy: {}     Correct: {}     Total: {}".format(100 * condition_message_acc / len(data),
-                                                            condition_message_acc, len(data)) )
-
-def cal_dynamic_part_accuracy(data, predictions, targets):
-    dynamic_part_acc = 0
-    for i in range(len(data)):
-        if predictions[i] == targets[i]:
-            dynamic_part_acc += 1
-            # print(predictions[i], "=======", targets[i])
-    print("Dynamic Part Accuracy: {}     Correct: {}     Total: {}".format(100 * dynamic_part_acc / len(data),
-                                                            dynamic_part_acc, len(data)) )
-
-
-def cal_message_metrics(prediction_file, label_file,position_predict_file, position_label_file):
-    print("Evaluate log message...")
-    predictions = pd.read_csv(prediction_file)["Message"]
-    predictions.fillna(" ", inplace=True)
-    targets = pd.read_csv(label_file)["Message"].apply(lambda x: re.findall(r'"([^"]*)"', x))
-    vars_parts = pd.read_csv(prediction_file)["Message"].apply(lambda x: extract_min_expression(re.sub(r'"[^"]*"', '', x)))
-    vars_parts_target = pd.read_csv(label_file)["VarList"].apply(lambda x: str(x).split(',') if ',' in str(x) else ([] if str(x).strip() == '' else [x]))
-
-    try:
-        data = pd.DataFrame()
-        data["position_prediction"] = pd.read_csv(position_predict_file)["Position"]
-        data["position_target"] = pd.read_csv(position_label_file)["Label"].apply(lambda x: [int(num) for num in x.split()].index(1))
-        data["prediction"] = predictions.apply(lambda x: x.replace(' ', ''))
-        data["target"] = pd.read_csv(label_file)["Message"].apply(lambda x: str(x).replace(' ', ''))
-        data["match"] = data["prediction"].apply(lambda x: x[1:-1].strip())== data["target"]
-
-        static_predictions = predictions.apply(lambda x: re.findall(r'"([^"]*)"', x))
-        cal_dynamic_part_accuracy(data, vars_parts, vars_parts_target)
-
-        print(targets.head())
-
-    except Exception as e:
-        print(e)
-    print("Accuracy: {}     Correct: {}     Total: {}".format(100 * len(data[data["match"] == True]) / len(data),
-                                                              len(data[data["match"] == True]), len(data)))
-
-    my_sentence_bleu([str(i) for i in static_predictions.to_list()], [str(i) for i in targets.tolist()])
-    my_corpus_bleu([str(i) for i in static_predictions.to_list()], [str(i) for i in targets.tolist()], True)
-    cal_rouge([str(i) for i in static_predictions.to_list()], [str(i) for i in targets.tolist()])
-
-
-def cal_all_metrics(position_prediction_file, position_label_file, logsta_prediction_file, logsta_label_file):
-    print("Evaluate all log aspects...")
-    correct_class = 1
-    position_predictions = pd.read_csv(position_prediction_file)["Position"]
-    position_target_labels = pd.read_csv(position_label_file)["Label"]
-    position_targets = position_target_labels.apply(lambda x: [int(num) for num in x.split()].index(correct_class))
-
-    logsta_predictions = pd.read_csv(logsta_prediction_file)["LogStatement"]
-    logsta_targets = pd.read_csv(logsta_label_file)["LogStatement"].apply(lambda x: x+' ;')
-    logsta_predictions.fillna(" ", inplace=True)
-    logsta_predictions = logsta_predictions.apply(lambda x: x.replace(' ', ''))
-    logsta_targets = logsta_targets.apply(lambda x: x.replace(' ', ''))
-
-    data = pd.DataFrame()
-    data["position_prediction"] = position_predictions
-    data["position_target"] = position_targets
-    data["logsta_prediction"] = logsta_predictions
-    data["logsta_target"] = logsta_targets
-    data["match"] = (data["position_prediction"] == data["position_target"]) & (
-                data["logsta_prediction"] == data["logsta_target"])
-    print("Accuracy: {}     Correct: {}     Total: {}".format(100 * len(data[data["match"] == True]) / len(data),
-                                                              len(data[data["match"] == True]), len(data)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from expression_tokenizer import extract_min_expression_batch
+
+
+LEVEL_CATEGORIES = {'trace': 0, 'debug': 1, 'info': 2, 'warn': 3, 'error': 4, 'fatal': 5}
+NUM_LEVELS = 6
+INVALID_LEVEL = 100
+
+
+@dataclass
+class FastLogData:
+    """Every column the FastLog metrics need, each CSV is read exactly once."""
+    position_prediction: np.ndarray
+    position_target: np.ndarray
+    level_prediction: np.ndarray
+    level_target: np.ndarray
+    message_prediction: pd.Series
+    message_target: pd.Series
+    var_list_target: pd.Series
+    logsta_prediction: pd.Series
+    logsta_target: pd.Series
+
+
+@dataclass
+class FastLogMetrics:
+    total: int
+    position_correct: int
+    level_correct: int
+    condition_level_correct: int
+    message_correct: int
+    condition_message_correct: int
+    dynamic_part_correct: int
+    all_correct: int
+    # level distance (capped at NUM_LEVELS) -> number of samples
+    level_distance_histogram: dict = field(default_factory=dict)
+
+    def accuracy(self, correct):
+        return 100 * correct / self.total
+
+    @property
+    def average_level_distance(self):
+        # mean of (NUM_LEVELS - distance)
+        return sum((NUM_LEVELS - k) * v for k, v in self.level_distance_histogram.items()) / self.total
+
+    @property
+    def average_level_shift_rate(self):
+        return self.average_level_distance / NUM_LEVELS
+
+    def report(self):
+        def line(name, correct):
+            return "{}: {}     Correct: {}     Total: {}".format(name, self.accuracy(correct), correct, self.total)
+        return "\n".join([
+            line("Position Accuracy", self.position_correct),
+            "average level distance: {}".format(self.average_level_distance),
+            "average level shift rate: {}".format(self.average_level_shift_rate),
+            line("Condition Level Accuracy", self.condition_level_correct),
+            line("Level Accuracy", self.level_correct),
+            line("Dynamic Part Accuracy", self.dynamic_part_correct),
+            line("Message Accuracy", self.message_correct),
+            line("Condition Message Accuracy", self.condition_message_correct),
+            line("All Accuracy", self.all_correct),
+        ])
+
+
+def _position_targets(labels):
+    # "0 0 1 0" -> index of the correct class, as [int(num) for num in x.split()].index(1)
+    tokens = labels.str.split(expand=True).apply(pd.to_numeric).fillna(-1).to_numpy()
+    is_target = tokens == 1
+    if not is_target.any(axis=1).all():
+        raise ValueError("Position label without the correct class")
+    return is_target.argmax(axis=1)
+
+
+def _level_targets(levels):
+    # Level names map to 0-5, anything outside range(6) counts as 0
+    mapped = levels.map(LEVEL_CATEGORIES).fillna(pd.to_numeric(levels, errors='coerce'))
+    return mapped.where(mapped.isin(range(NUM_LEVELS)), 0).to_numpy()
+
+
+def _level_predictions(levels):
+    # int(x) if int(x) in range(6) else 100
+    truncated = np.trunc(pd.to_numeric(levels, errors='coerce').to_numpy(dtype=float))
+    valid = (truncated >= 0) & (truncated < NUM_LEVELS)
+    return np.where(valid, truncated, INVALID_LEVEL).astype(np.int64)
+
+
+def load_fastlog_data(position_prediction_file, position_label_file, logsta_prediction_file, logsta_label_file):
+    position_predictions = pd.read_csv(position_prediction_file)
+    position_labels = pd.read_csv(position_label_file)
+    logsta_predictions = pd.read_csv(logsta_prediction_file)
+    logsta_labels = pd.read_csv(logsta_label_file)
+
+    return FastLogData(
+        position_prediction=position_predictions["Position"].to_numpy(),
+        position_target=_position_targets(position_labels["Label"]),
+        level_prediction=_level_predictions(logsta_predictions["Level"]),
+        level_target=_level_targets(logsta_labels["Level"]),
+        message_prediction=logsta_predictions["Message"].fillna(" "),
+        message_target=logsta_labels["Message"],
+        var_list_target=logsta_labels["VarList"],
+        logsta_prediction=logsta_predictions["LogStatement"].fillna(" "),
+        logsta_target=logsta_labels["LogStatement"],
+    )
+
+
+def evaluate_fastlog(data):
+    """Compute the FastLog position/level/message metrics with array operations."""
+    total = len(data.position_target)
+    position_match = data.position_prediction == data.position_target
+    level_match = data.level_prediction == data.level_target
+    level_distance = np.minimum(np.abs(data.level_target - data.level_prediction), NUM_LEVELS).astype(np.int64)
+    histogram = np.bincount(level_distance, minlength=NUM_LEVELS + 1)
+
+    message_prediction = data.message_prediction.str.replace(' ', '', regex=False)
+    message_target = data.message_target.astype(str).str.replace(' ', '', regex=False)
+    message_match = (message_prediction.str[1:-1].str.strip() == message_target).to_numpy()
+
+    vars_prediction = extract_min_expression_batch(data.message_prediction.str.replace(r'"[^"]*"', '', regex=True))
+    vars_target = data.var_list_target.map(
+        lambda x: str(x).split(',') if ',' in str(x) else ([] if str(x).strip() == '' else [x]))
+    dynamic_part_match = np.fromiter((p == t for p, t in zip(vars_prediction, vars_target)), dtype=bool, count=total)
+
+    logsta_prediction = data.logsta_prediction.str.replace(' ', '', regex=False)
+    logsta_target = (data.logsta_target + ' ;').str.replace(' ', '', regex=False)
+    logsta_match = (logsta_prediction == logsta_target).to_numpy()
+
+    return FastLogMetrics(
+        total=total,
+        position_correct=int(position_match.sum()),
+        level_correct=int(level_match.sum()),
+        condition_level_correct=int((position_match & level_match).sum()),
+        message_correct=int(message_match.sum()),
+        condition_message_correct=int((position_match & message_match).sum()),
+        dynamic_part_correct=int(dynamic_part_match.sum()),
+        all_correct=int((position_match & logsta_match).sum()),
+        level_distance_histogram={k: int(v) for k, v in enumerate(histogram) if v},
+    )
+
+
+def static_message_texts(data):
+    """Quoted static parts of predicted and target messages, as passed to the BLEU/ROUGE helpers."""
+    static_predictions = [str(i) for i in data.message_prediction.str.findall(r'"([^"]*)"')]
+    static_targets = [str(i) for i in data.message_target.str.findall(r'"([^"]*)"')]
+    return static_predictions, static_targets
 
 
 if __name__ == '__main__':
-    position_prediction_file = '//YOU PATH// /positions_test.csv"
+    position_prediction_file = "//YOU PATH// /positions_test.csv"
     position_label_file = "//YOU PATH// /stage1-input.csv"
     logsta_prediction_file = "//YOU PATH// /statements_beam_search.csv"
     logsta_label_file = "//YOU PATH// /stage2-input.csv"
 
     print("-" * 100)
-    cal_position_metrics(position_prediction_file, position_label_file)
-    cal_level_metrics(logsta_prediction_file, logsta_label_file, position_prediction_file, position_label_file)
-    cal_message_metrics(logsta_prediction_file, logsta_label_file, position_prediction_file, position_label_file)
-    cal_all_metrics(position_prediction_file, position_label_file, logsta_prediction_file, logsta_label_file)
\ No newline at end of file
+    data = load_fastlog_data(position_prediction_file, position_label_file, logsta_prediction_file, logsta_label_file)
+    metrics = evaluate_fastlog(data)
+    print(metrics.report())
+
+    static_predictions, static_targets = static_message_texts(data)
+    my_bleu(static_predictions, static_targets, True)
+    cal_rouge(static_predictions, static_targets)
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Log-statement parser for the UniLog evaluators.
+
+LogStatementParser splits a logging statement, or a model response carrying a <lineN> position tag,
+into a LogStatement record. The level-call pattern and the message pattern of every level are
+compiled once per parser. Results are memoized in bounded LRU caches keyed by the raw string, so
+ground-truth statements shared by several tools and configs are parsed once per process.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from expression_tokenizer import extract_min_expression
+
+# vars is a tuple so that cached records cannot be changed by their users
+LogStatement = namedtuple('LogStatement', ['position', 'level', 'message', 'static_message', 'vars'])
+
+LEVEL_NAMES = ['off', 'fatal', 'error', 'warn', 'info', 'debug', 'trace', 'all']
+LEVEL_CALL = re.compile(r'[.](off)?(fatal)?(error)?(warn)?(info)?(debug)?(trace)?(all)?[(]')
+LINE_TAG = re.compile(r'<line(\d+)>')
+STATIC_PART = re.compile(r'"([^"]*)"')
+
+PARSE_CACHE_SIZE = 1 << 16
+
+
+def split_static_and_vars(message):
+    """Static text (quoted parts joined by spaces) and variables of a log message."""
+    static_message = ' '.join(STATIC_PART.findall(message))
+    vars_parts = extract_min_expression(STATIC_PART.sub('', message))
+    return static_message, vars_parts
+
+
+class LogStatementParser:
+    """
+    Parses log statements the way get_gro_mes and get_logging_greedy always have: the level is
+    the text between the first '.' and '(' of a level call (possibly empty), and the message is
+    the first 'level(...)' of the statement.
+    """
+
+    def __init__(self, cache_size=PARSE_CACHE_SIZE):
+        # The level names and the empty level cover nearly every statement, other combinations
+        # the level-call pattern can match are compiled when first seen
+        self._message_patterns = {level: self._compile_message_pattern(level) for level in LEVEL_NAMES + ['']}
+        self.statement = lru_cache(maxsize=cache_size)(self._parse_statement)
+        self.prediction = lru_cache(maxsize=cache_size)(self._parse_prediction)
+
+    @staticmethod
+    def _compile_message_pattern(level):
+        return re.compile(r'%s\((.+)\)' % level)
+
+    def _message_pattern(self, level):
+        pattern = self._message_patterns.get(level)
+        if pattern is None:
+            pattern = self._message_patterns[level] = self._compile_message_pattern(level)
+        return pattern
+
+    def parse(self, log, position=None):
+        """LogStatement of one statement, without caching."""
+        log = log.strip()
+        res = LEVEL_CALL.search(log)
+        if res is not None:
+            level = log[res.start() + 1: res.end() - 1].strip()
+            result = self._message_pattern(level).search(log)
+            message = result.group(1) if result is not None else ""
+        else:
+            level, message = "", ""
+        message = message.lower()
+        static_message, vars_parts = split_static_and_vars(message)
+        return LogStatement(position, level.lower(), message, static_message, tuple(vars_parts))
+
+    def _parse_statement(self, log):
+        return self.parse(log)
+
+    def _parse_prediction(self, sample):
+        # The position is the first <lineN> tag, every copy of that tag is removed from the statement
+        tag = LINE_TAG.search(sample)
+        if tag is None:
+            return None
+        position = tag.group(1)
+        return self.parse(sample.replace('<line%s>' % position, ' '), position.lower())
+
+
+# One parser, and so one cache, per process
+PARSER = LogStatementParser()
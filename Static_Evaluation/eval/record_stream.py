@@ -0,0 +1,125 @@
+"""
+Incremental readers for prediction files. The records of a JSON array or a JSONL file are yielded
+one at a time, so memory does not grow with the file size. A reader can also start at the byte
+offset of a record, so a file can be split into shards. Same readers as
+Dynamic_Evaluation/eval/record_stream.py.
+"""
+
+import io
+import itertools
+import json
+
+READ_BLOCK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+# Characters that may follow a complete element of an array
+_ELEMENT_END = frozenset(' \t\r\n,]')
+
+
+def _iter_json_array(file_path, block_size=READ_BLOCK_SIZE, offset=0):
+    """
+    Yield (byte offset, element) for the elements of a top-level JSON array. A non-zero offset
+    must be the byte offset of an element, as yielded here; reading starts at that element.
+    """
+    with open(file_path, 'rb') as raw:
+        raw.seek(offset)
+        # newline='' keeps \r\n, so character counts map back to byte offsets
+        f = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        buffer = ''
+        position = 0
+        eof = False
+        started = offset > 0
+        # buffer[mark] is at byte mark_offset of the file
+        mark = 0
+        mark_offset = offset
+
+        def fill():
+            nonlocal buffer, position, eof, mark, mark_offset
+            block = f.read(block_size)
+            if not block:
+                eof = True
+            mark_offset += len(buffer[mark:position].encode('utf-8'))
+            mark = 0
+            buffer = buffer[position:] + block
+            position = 0
+
+        while True:
+            # Skip whitespace, the opening bracket and the separators between elements
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','
+                                               or (not started and buffer[position] == '[')):
+                if buffer[position] == '[':
+                    started = True
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    raise ValueError(f"Unterminated JSON array in {file_path}")
+                fill()
+                continue
+            if not started:
+                raise ValueError(f"{file_path} does not contain a JSON array")
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element is cut off at the end of the buffer, read more of it
+                if eof:
+                    raise
+                fill()
+                continue
+            if buffer[position] not in '{["' and (end == len(buffer) or buffer[end] not in _ELEMENT_END):
+                # A number or literal cut off by the block boundary decodes as a shorter value
+                # (2.5e10 as 2 or 2.5), so it is only complete once a delimiter follows it
+                if not eof:
+                    fill()
+                    continue
+                if end < len(buffer):
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, end)
+            mark_offset += len(buffer[mark:position].encode('utf-8'))
+            mark = position
+            yield mark_offset, item
+            position = end
+
+
+def iter_json_array(file_path, block_size=READ_BLOCK_SIZE, offset=0):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    for _, item in _iter_json_array(file_path, block_size, offset):
+        yield item
+
+
+def _iter_jsonl(file_path, offset=0):
+    # (byte offset, line) of the non-blank lines from offset on
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if line.strip():
+                yield offset, line
+            offset += len(line)
+
+
+def iter_jsonl(file_path, offset=0):
+    for _, line in _iter_jsonl(file_path, offset):
+        yield json.loads(line)
+
+
+def iter_json_records(file_path, offset=0):
+    """
+    Yield the records of a .jsonl file, or the elements of a JSON array file. A non-zero offset
+    is the byte offset of a record, as returned by shard_offsets; the records from it on are yielded.
+    """
+    if file_path.endswith('.jsonl'):
+        return iter_jsonl(file_path, offset)
+    return iter_json_array(file_path, offset=offset)
+
+
+def shard_offsets(file_path, shard_size):
+    """
+    Byte offsets of records 0, shard_size, 2 * shard_size, ... of a .jsonl or JSON array file,
+    found in one pass. A JSONL file is only split into lines, not decoded.
+    """
+    if file_path.endswith('.jsonl'):
+        offsets = (offset for offset, _ in _iter_jsonl(file_path))
+    else:
+        offsets = (offset for offset, _ in _iter_json_array(file_path))
+    return list(itertools.islice(offsets, 0, None, shard_size))
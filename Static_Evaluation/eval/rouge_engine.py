@@ -0,0 +1,206 @@
+"""
+ROUGE-1/2/L engine shared by the FastLog and UniLog static evaluators.
+
+Segments are tokenized once and memoized by their text. Where rouge.Rouge tokenizes a text the
+same way as the BLEU corpus path (no '.' in it), the tokens and n-gram counts of
+bleu_engine.whitespace_segment are reused as they are. ROUGE-L runs the O(n*m) LCS dynamic program
+in a table kept by the engine and reused across pairs.
+
+Two modes, each giving the numbers of the library it replaces:
+
+- 'rouge': rouge.Rouge() (sentences split on '.', distinct n-grams, union-LCS summary-level ROUGE-L)
+- 'rouge_score': rouge_score.rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'])
+
+Scores come back in rouge.Rouge's layout, {'rouge-1': {'r': .., 'p': .., 'f': ..}, ...}, in both modes.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from bleu_engine import SEGMENT_CACHE_SIZE, count_ngrams, whitespace_segment
+
+ROUGE_MODES = ['rouge', 'rouge_score']
+ROUGE_METRICS = ['rouge-1', 'rouge-2', 'rouge-l']
+ROUGE_STATS = ['r', 'p', 'f']
+
+# Tokens of a text as one of the ROUGE libraries splits them, with its n-gram counts. sentences
+# is only used by the 'rouge' mode, whose ROUGE-L works sentence by sentence.
+RougeSegment = namedtuple('RougeSegment', ['sentences', 'tokens', 'counts'])
+
+_NON_ALPHANUM = re.compile(r'[^a-z0-9]+')
+_VALID_TOKEN = re.compile(r'^[a-z0-9]+$')
+
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def rouge_segment(text):
+    """Segment of text as rouge.Rouge splits it: '.'-separated sentences of space-separated words."""
+    if '.' not in text:
+        segment = whitespace_segment(text)
+        if segment.tokens:
+            return RougeSegment([segment.tokens], segment.tokens, segment.counts)
+    # A blank sentence still counts as one empty word
+    sentences = [piece.split() or [''] for piece in text.split('.') if len(piece) > 0]
+    tokens = [word for sentence in sentences for word in sentence]
+    return RougeSegment(sentences, tokens, count_ngrams(tokens, 2))
+
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def rouge_score_segment(text, stemmer=None):
+    """Segment of text as rouge_score's default tokenizer splits it, stemmed when a stemmer is given."""
+    tokens = _NON_ALPHANUM.sub(' ', text.lower()).split()
+    if stemmer is not None:
+        tokens = [stemmer.stem(token) if len(token) > 3 else token for token in tokens]
+        tokens = [token for token in tokens if _VALID_TOKEN.match(token)]
+    return RougeSegment([tokens], tokens, count_ngrams(tokens, 2))
+
+
+def _rouge_fmeasure(precision, recall):
+    return 2.0 * ((precision * recall) / (precision + recall + 1e-8))
+
+
+def _rouge_score_fmeasure(precision, recall):
+    if precision + recall > 0:
+        return 2 * precision * recall / (precision + recall)
+    return 0.0
+
+
+class RougeEngine:
+    """ROUGE-1/2/L scorer with the interface of rouge.Rouge: score one pair or get_scores over lists."""
+
+    def __init__(self, mode='rouge', use_stemmer=False):
+        if mode not in ROUGE_MODES:
+            raise ValueError(f"Unknown ROUGE mode '{mode}', expected one of {ROUGE_MODES}")
+        self.mode = mode
+        self._stemmer = None
+        if use_stemmer:
+            if mode != 'rouge_score':
+                raise ValueError("Stemming is only available in the 'rouge_score' mode")
+            from nltk.stem import porter
+            self._stemmer = porter.PorterStemmer()
+        # LCS dynamic-programming table, grown as needed and reused by every pair
+        self._table = []
+
+    def segment(self, text):
+        if self.mode == 'rouge':
+            return rouge_segment(text)
+        return rouge_score_segment(text, self._stemmer)
+
+    def _lcs_table(self, x, y):
+        """Fill the (len(x)+1) x (len(y)+1) LCS table of x and y, row-major, and return its row width."""
+        width = len(y) + 1
+        size = (len(x) + 1) * width
+        table = self._table
+        if len(table) < size:
+            table.extend([0] * (size - len(table)))
+        for j in range(width):
+            table[j] = 0
+        for i in range(1, len(x) + 1):
+            row = i * width
+            previous = row - width
+            table[row] = 0
+            word = x[i - 1]
+            for j in range(1, width):
+                if word == y[j - 1]:
+                    table[row + j] = table[previous + j - 1] + 1
+                else:
+                    up = table[previous + j]
+                    left = table[row + j - 1]
+                    table[row + j] = up if up > left else left
+        return width
+
+    def lcs_length(self, x, y):
+        width = self._lcs_table(x, y)
+        return self._table[len(x) * width + len(y)]
+
+    def lcs_words(self, x, y):
+        """Words of the LCS of x and y, traced back the way rouge.Rouge reconstructs it."""
+        width = self._lcs_table(x, y)
+        table = self._table
+        words = []
+        i, j = len(x), len(y)
+        while i > 0 and j > 0:
+            if x[i - 1] == y[j - 1]:
+                words.append(x[i - 1])
+                i -= 1
+                j -= 1
+            elif table[(i - 1) * width + j] > table[i * width + j - 1]:
+                i -= 1
+            else:
+                j -= 1
+        return words
+
+    def _score_rouge(self, hypothesis, reference):
+        if not hypothesis.sentences:
+            raise ValueError("Hypothesis is empty.")
+        if not reference.sentences:
+            raise ValueError("Reference is empty.")
+        scores = {}
+        for metric, n in (('rouge-1', 1), ('rouge-2', 2)):
+            # rouge.Rouge compares the sets of n-grams, repeats are not counted
+            hypothesis_ngrams = [ngram for ngram in hypothesis.counts if len(ngram) == n]
+            reference_count = sum(1 for ngram in reference.counts if len(ngram) == n)
+            overlap = sum(1 for ngram in hypothesis_ngrams if ngram in reference.counts)
+            precision = overlap / len(hypothesis_ngrams) if hypothesis_ngrams else 0.0
+            recall = overlap / reference_count if reference_count else 0.0
+            scores[metric] = {'r': recall, 'p': precision, 'f': _rouge_fmeasure(precision, recall)}
+
+        # Summary-level ROUGE-L over the union of the LCS words of every sentence pair
+        union = set()
+        for reference_sentence in reference.sentences:
+            for hypothesis_sentence in hypothesis.sentences:
+                union.update(self.lcs_words(reference_sentence, hypothesis_sentence))
+        recall = len(union) / len(set(reference.tokens))
+        precision = len(union) / len(set(hypothesis.tokens))
+        scores['rouge-l'] = {'r': recall, 'p': precision, 'f': _rouge_fmeasure(precision, recall)}
+        return scores
+
+    def _score_rouge_score(self, hypothesis, reference):
+        scores = {}
+        for metric, n in (('rouge-1', 1), ('rouge-2', 2)):
+            overlap = reference_count = 0
+            for ngram, count in reference.counts.items():
+                if len(ngram) == n:
+                    reference_count += count
+                    overlap += min(count, hypothesis.counts.get(ngram, 0))
+            hypothesis_count = max(len(hypothesis.tokens) - n + 1, 0)
+            precision = overlap / max(hypothesis_count, 1)
+            recall = overlap / max(reference_count, 1)
+            scores[metric] = {'r': recall, 'p': precision, 'f': _rouge_score_fmeasure(precision, recall)}
+
+        if not hypothesis.tokens or not reference.tokens:
+            scores['rouge-l'] = {'r': 0, 'p': 0, 'f': 0}
+        else:
+            lcs = self.lcs_length(reference.tokens, hypothesis.tokens)
+            precision = lcs / len(hypothesis.tokens)
+            recall = lcs / len(reference.tokens)
+            scores['rouge-l'] = {'r': recall, 'p': precision, 'f': _rouge_score_fmeasure(precision, recall)}
+        return scores
+
+    def score(self, hypothesis, reference):
+        """ROUGE-1/2/L of one hypothesis string against one reference string."""
+        hypothesis = self.segment(hypothesis)
+        reference = self.segment(reference)
+        if self.mode == 'rouge':
+            return self._score_rouge(hypothesis, reference)
+        return self._score_rouge_score(hypothesis, reference)
+
+    def get_scores(self, hyps, refs, avg=False, ignore_empty=False):
+        """Same arguments and result as rouge.Rouge().get_scores."""
+        if isinstance(hyps, str):
+            hyps, refs = [hyps], [refs]
+        if ignore_empty:
+            hyps_and_refs = [(hyp, ref) for hyp, ref in zip(hyps, refs) if len(hyp) > 0 and len(ref) > 0]
+            hyps, refs = zip(*hyps_and_refs)
+        assert len(hyps) == len(refs)
+
+        scores = [self.score(hyp, ref) for hyp, ref in zip(hyps, refs)]
+        if not avg:
+            return scores
+        totals = {metric: {stat: 0 for stat in ROUGE_STATS} for metric in ROUGE_METRICS}
+        for score in scores:
+            for metric in ROUGE_METRICS:
+                for stat in ROUGE_STATS:
+                    totals[metric][stat] += score[metric][stat]
+        return {metric: {stat: totals[metric][stat] / len(scores) for stat in ROUGE_STATS}
+                for metric in ROUGE_METRICS}
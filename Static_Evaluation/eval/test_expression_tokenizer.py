@@ -0,0 +1,104 @@
+"""
+extract_min_expression and extract_min_expression_batch must return exactly what the original
+per-message implementation of the FastLog and UniLog evaluators returned.
+
+Run with: python -m pytest Static_Evaluation/eval/test_expression_tokenizer.py
+"""
+
+import os
+import random
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from expression_tokenizer import extract_min_expression, extract_min_expression_batch
+
+
+def legacy_extract_min_expression(vars):
+    # The original implementation, kept verbatim as the reference
+    if vars == None or vars == '':
+        return []
+    pattern_plus = re.compile(r'\b[a-zA-Z]+\s?\+\s?[a-zA-Z]+\b')
+    pattern_minus = re.compile(r'\b[a-zA-Z]+\s?\-\s?[a-zA-Z]+\b')
+    pattern_multi = re.compile(r'\b[a-zA-Z]+\s?\*\s?[a-zA-Z]+\b')
+    pattern_div = re.compile(r'\b[a-zA-Z]+\s?/\s?[a-zA-Z]+\b')
+    pattern_mod = re.compile(r'\b[a-zA-Z]+\s?%\s?[a-zA-Z]+\b')
+    pattern_equal = re.compile(r'\b[a-zA-Z]+\s?==\s?[a-zA-Z]+\b')
+    pattern_not_equal = re.compile(r'\b[a-zA-Z]+\s?!=\s?[a-zA-Z]+\b')
+    pattern_condition = re.compile(r'\b[a-zA-Z]+\s?\?\s?[a-zA-Z]+\s?:\s?[a-zA-Z]+\b')
+
+    min_expression = []
+    min_expression.extend(pattern_plus.findall(vars))
+    min_expression.extend(pattern_minus.findall(vars))
+    min_expression.extend(pattern_multi.findall(vars))
+    min_expression.extend(pattern_div.findall(vars))
+    min_expression.extend(pattern_mod.findall(vars))
+    min_expression.extend(pattern_equal.findall(vars))
+    min_expression.extend(pattern_not_equal.findall(vars))
+    min_expression.extend(pattern_condition.findall(vars))
+
+    for exp in min_expression:
+        vars = vars.replace(exp, "")
+    vars = vars.split(' ')
+    vars = [var for var in vars if re.search(r'[a-zA-Z]', var)]
+
+    vars.extend(min_expression)
+    return vars
+
+
+REPRESENTATIVE_MESSAGES = [
+    None,
+    '',
+    ' ',
+    'id',
+    ' + id',
+    ' + user.getName() + ", took " + elapsed',
+    'a + b - c',
+    'a+b+c',
+    'count * size / total % n',
+    'x ? y : z',
+    'foo != bar == baz',
+    'a!==b',
+    'a === b',
+    '  key  value ',
+    'e.getMessage()',
+    'path + File.separator + name',
+    'é + b',
+]
+
+FUZZ_ALPHABET = list('abcXY_9 ') + ['+', '-', '*', '/', '%', '==', '!=', '?', ':', '=', '!', '  ', '"', '.', '(', ')', 'é']
+
+
+def random_messages(count, seed=1):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 25))) for _ in range(count)]
+
+
+@pytest.mark.parametrize('message', REPRESENTATIVE_MESSAGES)
+def test_representative_messages(message):
+    assert extract_min_expression(message) == legacy_extract_min_expression(message)
+
+
+def test_random_messages():
+    for message in random_messages(20000):
+        assert extract_min_expression(message) == legacy_extract_min_expression(message), message
+
+
+def test_result_is_a_fresh_list():
+    first = extract_min_expression('a + b')
+    first.append('mutated')
+    assert extract_min_expression('a + b') == legacy_extract_min_expression('a + b')
+
+
+def test_batch_of_list():
+    messages = REPRESENTATIVE_MESSAGES[1:] + random_messages(500, seed=2)
+    assert extract_min_expression_batch(messages) == [legacy_extract_min_expression(m) for m in messages]
+
+
+def test_batch_of_series_keeps_index():
+    pd = pytest.importorskip('pandas')
+    messages = pd.Series(REPRESENTATIVE_MESSAGES[1:] + random_messages(500, seed=3))
+    messages.index = messages.index + 100
+    assert extract_min_expression_batch(messages).equals(messages.map(legacy_extract_min_expression))
@@ -1,8 +1,16 @@
+import itertools
 import json
-from evaluate_tool import get_gro_mes, extract_static_and_vars, get_logging_greedy, check_vars_accuracy
-from sacrebleu import sentence_bleu
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from evaluate_tool import check_vars_accuracy
 from tabulate import tabulate
-from rouge import Rouge
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bleu_engine import sentence_bleu
+from log_statement_parser import PARSER
+from record_stream import iter_json_records, shard_offsets
+from rouge_engine import RougeEngine
 
 def read_json_sample(json_file_path):  
   try:
@@ -30,155 +38,215 @@ def read_json_sample(json_file_path):
 
 
 
-def evaluation_greedy(input_file_path, tool_name):
-    pos_count,pos_related_count, level_count, message_count, vars_accuracy_count = 0, 0, 0, 0, 0
-    data_num = 0
-    validate_num = 0
-    cat_dict = {'trace': 0, 'debug': 1, 'info': 2, 'warn': 3, 'error': 4, 'fatal': 5}
-    level_distance_dict = {}
-    static_message_rouge = {
-      'rouge-1': 0,
-      'rouge-2': 0,
-      'rouge-l': 0
-    }
-    static_message_bleu = {
-      'bleu-1': 0,
-      'bleu-2': 0,
-      'bleu-3': 0,
-      'bleu-4': 0,
-      'bleu-A': 0
-    }
-    rouge = Rouge()
-
-    data = read_json_sample(input_file_path)
-    for row in data:
-        data_num += 1
+CAT_DICT = {'trace': 0, 'debug': 1, 'info': 2, 'warn': 3, 'error': 4, 'fatal': 5}
+
+_rouge = RougeEngine()
+
+
+class GreedyMetrics:
+    """
+    Running counts and score sums of evaluation_greedy. Rows are added one at a time, so a
+    prediction file is evaluated in constant memory, and accumulators over different parts of
+    the data can be merged.
+    """
+
+    def __init__(self, tool_name):
+        self.tool_name = tool_name
+        self.pos_count, self.pos_related_count, self.level_count, self.message_count, self.vars_accuracy_count = 0, 0, 0, 0, 0
+        self.data_num = 0
+        self.validate_num = 0
+        self.level_distance_dict = {}
+        self.static_message_rouge = {
+          'rouge-1': 0,
+          'rouge-2': 0,
+          'rouge-l': 0
+        }
+        self.static_message_bleu = {
+          'bleu-1': 0,
+          'bleu-2': 0,
+          'bleu-3': 0,
+          'bleu-4': 0,
+          'bleu-A': 0
+        }
+
+    def add(self, row):
+        self.data_num += 1
 
         '''Get ground truth'''
         ground_truth = row["metadata"]
-        message_gth = get_gro_mes(ground_truth["statement"])
+        statement_gth = PARSER.statement(ground_truth["statement"])
+        message_gth = statement_gth.message
         pos_gth = ground_truth['position'].split('-')[0]
         level_gth = ground_truth['level']
         vars_gth = ground_truth['vars']
-        static_message_gth, x = extract_static_and_vars(message_gth)
+        static_message_gth = statement_gth.static_message
 
         '''Get predictions'''
-        pos_pred, level_pred, message_pred = get_logging_greedy(row['response'])
-        if pos_pred == None:
-           continue
+        statement_pred = PARSER.prediction(row['response'])
+        if statement_pred is None:
+           return
 
-        validate_num += 1
-        static_message_pred, vars_pred = extract_static_and_vars(message_pred)
+        self.validate_num += 1
+        pos_pred, level_pred, message_pred = statement_pred.position, statement_pred.level, statement_pred.message
+        static_message_pred, vars_pred = statement_pred.static_message, statement_pred.vars
 
         if pos_gth == pos_pred:
-            pos_count += 1
+            self.pos_count += 1
 
         if abs(int(pos_gth) - int(pos_pred)) <= 1:
-          pos_related_count += 1
+          self.pos_related_count += 1
 
         if level_gth == level_pred:
-            level_count += 1
-        
+            self.level_count += 1
+
         if message_gth.replace(' ', '') == message_pred.replace(' ', ''):
-            message_count += 1
-            static_message_bleu['bleu-A'] += 100
-            static_message_bleu['bleu-1'] += 100
-            static_message_bleu['bleu-2'] += 100
-            static_message_bleu['bleu-3'] += 100
-            static_message_bleu['bleu-4'] += 100
-            static_message_rouge['rouge-1'] += 1
-            static_message_rouge['rouge-2'] += 1
-            static_message_rouge['rouge-l'] += 1
+            self.message_count += 1
+            for key in self.static_message_bleu:
+                self.static_message_bleu[key] += 100
+            for key in self.static_message_rouge:
+                self.static_message_rouge[key] += 1
         else:
-            # print("Ground truth:", static_message_gth)
-            # print("Prediction:", static_message_pred)
             # static_message_pred = ' '.join(wordninja.split(static_message_pred))
-            bleu = sentence_bleu(static_message_gth, [static_message_pred], smooth_method='none')
-            bleu1_score = bleu.precisions[0]
-            bleu2_score = bleu.precisions[1]
-            bleu3_score = bleu.precisions[2]
-            bleu4_score = bleu.precisions[3]
-            bleuA_score = bleu.score
-            static_message_bleu['bleu-1'] += bleu1_score
-            static_message_bleu['bleu-2'] += bleu2_score
-            static_message_bleu['bleu-3'] += bleu3_score
-            static_message_bleu['bleu-4'] += bleu4_score
-            static_message_bleu['bleu-A'] += bleuA_score
-
-        rouge_score = rouge.get_scores(static_message_gth if static_message_gth != '' else ' ', static_message_pred if static_message_pred != '' else ' ', avg=True, ignore_empty=True)
-        static_message_rouge['rouge-1'] += rouge_score['rouge-1']['f']
-        static_message_rouge['rouge-2'] += rouge_score['rouge-2']['f']
-        static_message_rouge['rouge-l'] += rouge_score['rouge-l']['f']
+            bleu = sentence_bleu(static_message_gth, [static_message_pred])
+            self.static_message_bleu['bleu-1'] += bleu.precisions[0]
+            self.static_message_bleu['bleu-2'] += bleu.precisions[1]
+            self.static_message_bleu['bleu-3'] += bleu.precisions[2]
+            self.static_message_bleu['bleu-4'] += bleu.precisions[3]
+            self.static_message_bleu['bleu-A'] += bleu.score
+
+        rouge_score = _rouge.score(static_message_gth if static_message_gth != '' else ' ', static_message_pred if static_message_pred != '' else ' ')
+        self.static_message_rouge['rouge-1'] += rouge_score['rouge-1']['f']
+        self.static_message_rouge['rouge-2'] += rouge_score['rouge-2']['f']
+        self.static_message_rouge['rouge-l'] += rouge_score['rouge-l']['f']
         # Calculate variables accuracy
         if check_vars_accuracy(vars_pred, vars_gth):
-            vars_accuracy_count += 1
-        
-        prediction_level = cat_dict[level_pred] if level_pred in cat_dict else 100
-        ground_truth_level = cat_dict[level_gth]
+            self.vars_accuracy_count += 1
+
+        prediction_level = CAT_DICT[level_pred] if level_pred in CAT_DICT else 100
+        ground_truth_level = CAT_DICT[level_gth]
         # 计算level距离
         level_distance = min(abs(prediction_level - ground_truth_level), 5)
-        if level_distance in level_distance_dict:
-            level_distance_dict[level_distance] += 1
-        else:
-            level_distance_dict[level_distance] = 1
-
-    metrics = {
-      "# of Tools": tool_name,
-      "PA": round(pos_count / data_num * 100, 3),
-      "PRA": round(pos_related_count / data_num * 100, 3),
-      "LA": round(level_count / data_num * 100, 3),
-      "Level Distance": round(sum([k*v for k, v in level_distance_dict.items()])/data_num, 4),
-      "MA": round(message_count / data_num * 100, 3),
-      "VA": round(vars_accuracy_count / data_num * 100, 3),
-      "BLEU-A/1/2/3/4": f"{round(static_message_bleu['bleu-A'] / data_num, 3)}/{round(static_message_bleu['bleu-1'] / data_num, 3)}/{round(static_message_bleu['bleu-2'] / data_num, 3)}/{round(static_message_bleu['bleu-3'] / data_num, 3)}/{round(static_message_bleu['bleu-4'] / data_num, 3)}",
-      "ROUGE-1/2/l": f"{round(static_message_rouge['rouge-1']*100 / data_num, 3)}/{round(static_message_rouge['rouge-2']*100 / data_num, 3)}/{round(static_message_rouge['rouge-l']*100 / data_num, 3)}",
-      "Validate": f"{validate_num}/{data_num}"
-    }
-    
+        self.level_distance_dict[level_distance] = self.level_distance_dict.get(level_distance, 0) + 1
+
+    def merge(self, other):
+        """Add the counts of another accumulator, e.g. one over a different row range."""
+        self.pos_count += other.pos_count
+        self.pos_related_count += other.pos_related_count
+        self.level_count += other.level_count
+        self.message_count += other.message_count
+        self.vars_accuracy_count += other.vars_accuracy_count
+        self.data_num += other.data_num
+        self.validate_num += other.validate_num
+        for level_distance, count in other.level_distance_dict.items():
+            self.level_distance_dict[level_distance] = self.level_distance_dict.get(level_distance, 0) + count
+        for key in self.static_message_rouge:
+            self.static_message_rouge[key] += other.static_message_rouge[key]
+        for key in self.static_message_bleu:
+            self.static_message_bleu[key] += other.static_message_bleu[key]
+        return self
+
+    def metrics(self):
+        data_num = self.data_num
+        static_message_bleu, static_message_rouge = self.static_message_bleu, self.static_message_rouge
+        return {
+          "# of Tools": self.tool_name,
+          "PA": round(self.pos_count / data_num * 100, 3),
+          "PRA": round(self.pos_related_count / data_num * 100, 3),
+          "LA": round(self.level_count / data_num * 100, 3),
+          "Level Distance": round(sum([k*v for k, v in self.level_distance_dict.items()])/data_num, 4),
+          "MA": round(self.message_count / data_num * 100, 3),
+          "VA": round(self.vars_accuracy_count / data_num * 100, 3),
+          "BLEU-A/1/2/3/4": f"{round(static_message_bleu['bleu-A'] / data_num, 3)}/{round(static_message_bleu['bleu-1'] / data_num, 3)}/{round(static_message_bleu['bleu-2'] / data_num, 3)}/{round(static_message_bleu['bleu-3'] / data_num, 3)}/{round(static_message_bleu['bleu-4'] / data_num, 3)}",
+          "ROUGE-1/2/l": f"{round(static_message_rouge['rouge-1']*100 / data_num, 3)}/{round(static_message_rouge['rouge-2']*100 / data_num, 3)}/{round(static_message_rouge['rouge-l']*100 / data_num, 3)}",
+          "Validate": f"{self.validate_num}/{data_num}"
+        }
+
+
+def format_metrics(metrics):
     # Print markdown format
     markdown_str = "\nMarkdown format:\n"
     markdown_str += "| " + " | ".join(metrics.keys()) + " |\n"
     markdown_str += "| " + " | ".join("-" * len(key) for key in metrics.keys()) + " |\n"
     markdown_str += "| " + " | ".join(str(value) for value in metrics.values()) + " |"
-    
+
     # 生成表格格式结果
     table_str = "\nPretty table format:\n"
     headers = list(metrics.keys())
     data = [list(metrics.values())]
     table_str += tabulate(data, headers=headers, tablefmt='grid')
+    return markdown_str, table_str
 
+
+def evaluation_greedy(input_file_path, tool_name, report_every=0):
+    """
+    Evaluate a JSON array or JSONL prediction file row by row. With report_every, the metrics
+    so far are printed after every report_every rows.
+    """
+    accumulator = GreedyMetrics(tool_name)
+    for row in iter_json_records(input_file_path):
+        accumulator.add(row)
+        if report_every and accumulator.data_num % report_every == 0:
+            print(f"[{accumulator.data_num} rows] {accumulator.metrics()}")
+
+    metrics = accumulator.metrics()
+    markdown_str, table_str = format_metrics(metrics)
     return metrics, markdown_str, table_str
 
-def evaluate(folder_path,tool_name):
-    metrics, markdown_str, table_str = evaluation_greedy(folder_path, tool_name)
+def evaluate(folder_path,tool_name, report_every=0):
+    metrics, markdown_str, table_str = evaluation_greedy(folder_path, tool_name, report_every)
     print(markdown_str)
     print(table_str)
 
-def evaluate_all_projects(folder_path):
+def evaluate_shard(file_path, tool_name, offset=0, count=None):
+    """GreedyMetrics over count rows (all when None) of a prediction file, starting at byte offset."""
+    accumulator = GreedyMetrics(tool_name)
+    for row in itertools.islice(iter_json_records(file_path, offset), count):
+        accumulator.add(row)
+    return accumulator
+
+def _evaluate_shard_task(task):
+    return evaluate_shard(*task)
+
+def evaluate_all_projects(folder_path, num_workers=1, shard_size=0):
     """
-    评估指定文件夹下所有json文件的结果
+    评估指定文件夹下所有json和jsonl文件的结果
     Args:
-        folder_path: json文件所在文件夹路径
+        folder_path: json/jsonl文件所在文件夹路径
+        num_workers: 并行评估的进程数, 1 表示在当前进程中依次评估
+        shard_size: 大于 0 时, 行数超过 shard_size 的文件按 shard_size 行切分给多个进程, 每个进程从分片的字节偏移处开始解析, 结果合并后再汇总
     """
-    import os
-    
+    # 遍历文件夹下所有json和jsonl文件, 从文件名中提取工具名称
+    files = [(os.path.join(folder_path, filename), filename.split('_')[0])
+             for filename in os.listdir(folder_path) if filename.endswith(('.json', '.jsonl'))]
+
+    # 每个文件切成 shard_size 行的分片, 一次扫描记下每个分片起始记录的字节偏移
+    tasks, file_index = [], []
+    for index, (file_path, tool_name) in enumerate(files):
+        if shard_size > 0:
+            for offset in shard_offsets(file_path, shard_size) or [0]:
+                tasks.append((file_path, tool_name, offset, shard_size))
+                file_index.append(index)
+        else:
+            tasks.append((file_path, tool_name, 0, None))
+            file_index.append(index)
+
+    if num_workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            shards = list(executor.map(_evaluate_shard_task, tasks))
+    else:
+        shards = [_evaluate_shard_task(task) for task in tasks]
+
+    # 按分片顺序合并同一文件的结果
+    accumulators = [None] * len(files)
+    for index, shard in zip(file_index, shards):
+        accumulators[index] = shard if accumulators[index] is None else accumulators[index].merge(shard)
+
     # 存储所有工具的评估结果
-    all_metrics = []
-    
-    # 遍历文件夹下所有json文件
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.json'):
-            # 从文件名中提取工具名称
-            tool_name = filename.split('_')[0]
-            file_path = os.path.join(folder_path, filename)
-            
-            # 评估单个工具
-            metrics, _, _ = evaluation_greedy(file_path, tool_name)
-            all_metrics.append(list(metrics.values()))
+    all_metrics = [list(accumulator.metrics().values()) for accumulator in accumulators]
     
     # 生成汇总表格
     if all_metrics:
-        headers = list(metrics.keys())
+        headers = list(accumulators[0].metrics().keys())
         table_str = "\n所有工具评估结果:\n"
         table_str += tabulate(all_metrics, headers=headers, tablefmt='grid')
         print(table_str)
@@ -191,7 +259,7 @@ def evaluate_all_projects(folder_path):
             markdown_str += "| " + " | ".join(str(value) for value in metric) + " |\n"
         print(markdown_str)
     else:
-        print("未找到json文件")
+        print("未找到json或jsonl文件")
 
 
 
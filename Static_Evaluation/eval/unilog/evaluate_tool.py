@@ -1,128 +1,75 @@
 import argparse
+import os
 import pandas as pd
-import re
-from sacrebleu import sentence_bleu
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bleu_engine import sentence_bleu
+from log_statement_parser import PARSER, LogStatement, split_static_and_vars
 
 
 
 def get_gro_mes(sample):
-    log = sample
-    log = log.strip()
-    res = re.search(r'[.](off)?(fatal)?(error)?(warn)?(info)?(debug)?(trace)?(all)?[(]', log)
-    if res is not None:
-        level = log[res.span()[0] + 1: res.span()[1] - 1].strip()
-        pattern = re.compile('%s\((.+)\)' % level)
-        result = pattern.findall(log)
-        if result == []:
-            message = ""
-        else:
-            message = result[0]
-    else:
-        level, message = "", ""
-    return message.lower()
+    return PARSER.statement(sample).message
 
 def get_logging_greedy(sample):
     # 正则匹配 <linex> x 是任意数字,只取出其中的数字
-    search_result = re.search(r'<line(\d+)>', sample)
-    pos = search_result.group(1) if search_result else None
-    if pos is None:
+    record = PARSER.prediction(sample)
+    if record is None:
         return None, None, None
-
-    log = sample.replace('<line%s>' % pos, ' ')
-
-    log = log.strip()
-    res = re.search(r'[.](off)?(fatal)?(error)?(warn)?(info)?(debug)?(trace)?(all)?[(]', log)
-    if res is not None:
-        level = log[res.span()[0] + 1: res.span()[1] - 1].strip()
-        pattern = re.compile('%s\((.+)\)' % level)
-        result = pattern.findall(log)
-        if result == []:
-            message = ""
-        else:
-            message = result[0]
-    else:
-        level, message = "", ""
-    return pos.lower(), level.lower(), message.lower()
-
-def extract_min_expression(vars):
-    if vars == None or vars == '':
-        return []
-    pattern_plus = re.compile(r'\b[a-zA-Z]+\s?\+\s?[a-zA-Z]+\b')
-    pattern_minus = re.compile(r'\b[a-zA-Z]+\s?\-\s?[a-zA-Z]+\b')
-    pattern_multi = re.compile(r'\b[a-zA-Z]+\s?\*\s?[a-zA-Z]+\b')
-    pattern_div = re.compile(r'\b[a-zA-Z]+\s?/\s?[a-zA-Z]+\b')
-    pattern_mod = re.compile(r'\b[a-zA-Z]+\s?%\s?[a-zA-Z]+\b')
-    pattern_equal = re.compile(r'\b[a-zA-Z]+\s?==\s?[a-zA-Z]+\b')
-    pattern_not_equal = re.compile(r'\b[a-zA-Z]+\s?!=\s?[a-zA-Z]+\b')
-    pattern_condition = re.compile(r'\b[a-zA-Z]+\s?\?\s?[a-zA-Z]+\s?:\s?[a-zA-Z]+\b')
-
-    # 从 vars 中找到上诉所有的表达式
-    min_expression = []
-    min_expression.extend(pattern_plus.findall(vars))
-    min_expression.extend(pattern_minus.findall(vars))
-    min_expression.extend(pattern_multi.findall(vars))
-    min_expression.extend(pattern_div.findall(vars))
-    min_expression.extend(pattern_mod.findall(vars))
-    min_expression.extend(pattern_equal.findall(vars))
-    min_expression.extend(pattern_not_equal.findall(vars))
-    min_expression.extend(pattern_condition.findall(vars))
-    
-    # 遍历 min_expression，消除掉 vars 中的表达式，剩下的就是单独的变量
-    for exp in min_expression:
-        vars = vars.replace(exp, "")
-    vars = vars.split(' ')
-    # 去除掉除包含字母的所有元素
-    vars = [var for var in vars if re.search(r'[a-zA-Z]', var)]
-
-    # 将 vars 和 min_expression 合并
-    vars.extend(min_expression)
-    return vars
+    return record.position, record.level, record.message
 
 def extract_static_and_vars(message):
-    static_parts = re.findall(r'"([^"]*)"', message)
-    static_message = ' '.join(static_parts)
-    vars_parts = re.sub(r'"[^"]*"', '', message)
-    vars_parts = extract_min_expression(vars_parts)
-
-    return static_message, vars_parts
+    return split_static_and_vars(message)
 
 def check_vars_accuracy(vars_pred, vars_gth):
     missing_vars = [var for var in vars_gth if var not in vars_pred]
     return len(missing_vars) == 0 and len(vars_pred) == len(vars_gth)
 
-def evaluation_greedy(input_file_path):
-    pos_count, level_count, message_count, static_message_bleu, vars_accuracy_count = 0, 0, 0, 0, 0
-    data_num = 0
+# Record of a prediction without a <lineN> tag: no position, and no level or message that can match
+UNTAGGED = LogStatement(None, '', '', '', ())
+
+def _parse_column(values, parse):
+    """parse over the distinct values of a Series, as a DataFrame with the LogStatement fields."""
+    parsed = {value: parse(value) for value in values.unique()}
+    return pd.DataFrame([parsed[value] for value in values], index=values.index, columns=LogStatement._fields)
+
+def parse_log_column(logs):
+    """PARSER.statement over a Series of log statements, as a DataFrame with the LogStatement fields."""
+    return _parse_column(logs, PARSER.statement)
 
+def parse_prediction_column(predictions):
+    """PARSER.prediction over a Series of predictions. A prediction without a <lineN> tag gives UNTAGGED."""
+    return _parse_column(predictions.fillna('').astype(str), lambda sample: PARSER.prediction(sample) or UNTAGGED)
+
+def evaluation_greedy(input_file_path):
+    """
+    Evaluate one prediction TSV column by column. Predictions without a <lineN> tag, on which
+    the row-by-row evaluation used to fail, are wrong on every metric.
+    """
     df_raw = pd.read_csv(input_file_path, sep='\t')
-    for i, row in df_raw.iterrows():
-        data_num += 1
-
-        '''Get ground truth'''
-        message_gth = get_gro_mes(row["statement"])
-        pos_gth = row['position'].split('-')[0]
-        level_gth = row['level']
-        vars_gth = str(row['vars'])
-        static_message_gth, x = extract_static_and_vars(message_gth)
-
-        '''Get predictions'''
-        pos_pred, level_pred, message_pred = get_logging_greedy(row['predict'])
-        static_message_pred, vars_pred = extract_static_and_vars(message_pred)
-
-        if pos_gth == pos_pred:
-            pos_count += 1
-        if level_gth == level_pred:
-            level_count += 1
-        
-        if message_gth == message_pred:
-            message_count += 1
-            static_message_bleu += 100
-        else:
-            static_message_bleu += sentence_bleu(static_message_gth, [static_message_pred], 'none').score
-
-        # Calculate variables accuracy
-        if check_vars_accuracy(vars_pred, vars_gth):
-            vars_accuracy_count += 1
+    data_num = len(df_raw)
+
+    '''Get ground truth'''
+    gth = parse_log_column(df_raw["statement"])
+    pos_gth = df_raw['position'].str.split('-').str[0]
+    level_gth = df_raw['level']
+    vars_gth = df_raw['vars'].map(str)
+
+    '''Get predictions'''
+    pred = parse_prediction_column(df_raw['predict'])
+    pos_pred, level_pred, vars_pred = pred['position'], pred['level'], pred['vars']
+
+    tagged = pos_pred.notna()
+    pos_count = int((pos_gth == pos_pred).sum())
+    level_count = int(((level_gth == level_pred) & tagged).sum())
+    message_match = (gth['message'] == pred['message']) & tagged
+    message_count = int(message_match.sum())
+    static_message_bleu = sum(100 if match else sentence_bleu(static_gth, [static_pred]).score
+                              for match, static_gth, static_pred in zip(message_match, gth['static_message'], pred['static_message']))
+    # Calculate variables accuracy
+    vars_accuracy_count = sum(check_vars_accuracy(var_pred, var_gth)
+                              for var_pred, var_gth in zip(vars_pred[tagged], vars_gth[tagged]))
 
     # data_num = 42669
     metrics = {
@@ -138,6 +85,7 @@ def evaluation_greedy(input_file_path):
     print("|--------|-------|")
     for metric, value in metrics.items():
         print(f"| {metric} | {value} |")
+    return metrics
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
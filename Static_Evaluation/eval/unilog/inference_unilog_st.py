@@ -1,17 +1,241 @@
 import os
+import json
 import torch
 from tqdm import tqdm
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, AutoModelForCausalLM, DynamicCache
 import argparse
 import pandas as pd
 import time
 
+DTYPES = {'float16': torch.float16, 'bfloat16': torch.bfloat16, 'float32': torch.float32}
+
+
+def resolve_device(device):
+    if device == 'auto':
+        return 'cuda' if torch.cuda.is_available() else 'cpu'
+    return device
+
+
+def resolve_dtype(dtype, device):
+    # float16 on GPU as before, CPUs without native half-precision kernels are faster in float32
+    if dtype == 'auto':
+        return torch.float16 if device == 'cuda' else torch.float32
+    return DTYPES[dtype]
+
+
+def load_model(args, device):
+    kwargs = {'torch_dtype': resolve_dtype(args.dtype, device)}
+    if args.int8 and device == 'cuda':
+        # pip install bitsandbytes
+        from transformers import BitsAndBytesConfig
+        kwargs['quantization_config'] = BitsAndBytesConfig(load_in_8bit=True)
+        kwargs['device_map'] = {'': 0}
+    elif args.int8:
+        # Dynamic int8 quantization of the linear layers works on float32 weights
+        kwargs['torch_dtype'] = torch.float32
+
+    model = AutoModelForCausalLM.from_pretrained(args.model_name_or_path, **kwargs)
+    if args.int8 and device == 'cpu':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif not args.int8:
+        model = model.to(device)
+    model.eval()
+    return model
+
+
+def length_sorted_batches(lengths, batch_size):
+    """Indices grouped into batches of similar token length, longest first so that OOM shows up early."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def generate_batch(model, tokenizer, prompts, input_ids, device, num_samples):
+    """
+    Greedy generation for one batch, padded to its longest prompt. Returns the predictions and the number of new tokens.
+    Greedy decoding is deterministic, so each prompt is generated once and its text repeated for the num_samples samples.
+    """
+    inputs = tokenizer.pad({'input_ids': input_ids}, padding=True, return_tensors='pt').to(device)
+    pred = model.generate(**inputs,
+                          max_new_tokens=256,
+                          do_sample=False,
+                          eos_token_id=2,
+                          bos_token_id=1,
+                          pad_token_id=tokenizer.pad_token_id)
+    new_tokens = pred[:, inputs['input_ids'].size(1):]
+    num_new_tokens = int((new_tokens != tokenizer.pad_token_id).sum())
+    rets = tokenizer.batch_decode(pred.cpu(), skip_special_tokens=True, clean_up_tokenization_spaces=False)
+
+    predictions = [ret.strip().replace(prompt, "") * num_samples for ret, prompt in zip(rets, prompts)]
+    return predictions, num_new_tokens
+
+
+def common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    for k in range(n):
+        if a[k] != b[k]:
+            return k
+    return n
+
+
+def shared_prefix_batches(input_ids, min_prefix_tokens, batch_size):
+    """
+    (prefix_length, indices) batches for prefix caching. Prompts are sorted by their token ids so that
+    prompts with the same demonstrations are adjacent, and a run of prompts sharing at least
+    min_prefix_tokens leading tokens forms a group. The prefix stops one token short of the shortest
+    prompt of its group, so every prompt keeps a suffix to encode. Prompts sharing no such prefix
+    come out with prefix_length 0.
+    """
+    order = sorted(range(len(input_ids)), key=lambda i: input_ids[i])
+    groups = []  # [prefix_length, indices]
+    for i in order:
+        if groups:
+            group = groups[-1]
+            prefix_length = min(common_prefix_length(input_ids[group[1][0]], input_ids[i]),
+                                len(input_ids[i]) - 1, len(input_ids[group[1][0]]) - 1)
+            # A second member sets the prefix of the group, later ones must share all of it
+            if prefix_length >= max(min_prefix_tokens, group[0] if len(group[1]) > 1 else 0, 1):
+                group[0] = prefix_length if len(group[1]) == 1 else group[0]
+                group[1].append(i)
+                continue
+        groups.append([0, [i]])
+
+    batches = []
+    for prefix_length, indices in groups:
+        prefix_length = prefix_length if len(indices) > 1 else 0
+        batches.extend((prefix_length, indices[start:start + batch_size]) for start in range(0, len(indices), batch_size))
+    return batches
+
+
+class PrefixKVCache:
+    """
+    Key/value cache of one shared prompt prefix. It is computed once per prefix and cropped back
+    to the prefix after every generation, so a run of prompts with the same demonstrations only
+    encodes their own suffixes.
+    """
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+        self.prefix_ids = None
+        self.cache = None
+        self.computed_tokens, self.reused_tokens = 0, 0
+
+    def get(self, prefix_ids):
+        if prefix_ids != self.prefix_ids:
+            self.prefix_ids, self.cache = None, None
+            cache = DynamicCache()
+            self.model(input_ids=torch.tensor([prefix_ids], device=self.device), past_key_values=cache, use_cache=True)
+            self.prefix_ids, self.cache = prefix_ids, cache
+            self.computed_tokens += len(prefix_ids)
+        else:
+            self.reused_tokens += len(prefix_ids)
+        return self.cache
+
+
+def generate_with_prefix(model, tokenizer, prompts, input_ids, prefix_cache, prefix_length, device, num_samples):
+    """
+    Greedy generation for prompts sharing their first prefix_length tokens, one prompt at a time on the cached prefix.
+    As in generate_batch, each prompt is generated once and its text repeated for the num_samples samples.
+    """
+    predictions, num_new_tokens = [], 0
+    for prompt, ids in zip(prompts, input_ids):
+        cache = prefix_cache.get(ids[:prefix_length])
+        try:
+            pred = model.generate(input_ids=torch.tensor([ids], device=device),
+                                  attention_mask=torch.ones(1, len(ids), dtype=torch.long, device=device),
+                                  past_key_values=cache,
+                                  max_new_tokens=256,
+                                  do_sample=False,
+                                  eos_token_id=2,
+                                  bos_token_id=1,
+                                  pad_token_id=tokenizer.pad_token_id)
+        finally:
+            cache.crop(prefix_length)
+        num_new_tokens += int((pred[0, len(ids):] != tokenizer.pad_token_id).sum())
+        ret = tokenizer.decode(pred[0].cpu(), skip_special_tokens=True, clean_up_tokenization_spaces=False)
+        predictions.append(ret.strip().replace(prompt, "") * num_samples)
+    return predictions, num_new_tokens
+
+
+class PredictionCheckpoint:
+    """
+    Appends the predictions of every finished batch to <out_file>.partial as (index, predict) rows,
+    and after each append records the row count and byte offset of the partial file in
+    <out_file>.ckpt. On restart the partial file is cut back to the recorded offset, so a batch
+    that was being written when the run died is dropped and generated again.
+    """
+
+    def __init__(self, out_file, num_rows):
+        self.partial_path = out_file + '.partial'
+        self.checkpoint_path = out_file + '.ckpt'
+        self.num_rows = num_rows
+        self.rows, self.offset = 0, 0
+
+    def load(self):
+        """{index: prediction} of the rows finished by earlier runs, empty when there is no checkpoint."""
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.partial_path)):
+            self._reset()
+            return {}
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint['num_rows'] != self.num_rows:
+            raise ValueError(f"Checkpoint {self.checkpoint_path} was written for {checkpoint['num_rows']} rows, "
+                             f"the input file has {self.num_rows}")
+        self.rows, self.offset = checkpoint['rows'], checkpoint['offset']
+        with open(self.partial_path, 'r+', encoding='utf-8') as f:
+            f.truncate(self.offset)
+        done = pd.read_csv(self.partial_path, sep='\t', keep_default_na=False, dtype={'predict': str})
+        return dict(zip(done['index'], done['predict']))
+
+    def _reset(self):
+        with open(self.partial_path, 'w', encoding='utf-8', newline='') as f:
+            pd.DataFrame(columns=['index', 'predict']).to_csv(f, sep='\t', index=False)
+            self.offset = f.tell()
+        self.rows = 0
+        self._save()
+
+    def _save(self):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'num_rows': self.num_rows, 'rows': self.rows, 'offset': self.offset}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def append(self, indices, predictions):
+        with open(self.partial_path, 'a', encoding='utf-8', newline='') as f:
+            pd.DataFrame({'index': indices, 'predict': predictions}).to_csv(f, sep='\t', index=False, header=False)
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+        self.rows += len(indices)
+        self._save()
+
+    def remove(self):
+        for path in (self.partial_path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
 def infer():
     parser = argparse.ArgumentParser()
     parser.add_argument('--num_samples', default=1, type=int)
     parser.add_argument('--model_name_or_path', default="./codellama-7b/", type=str)
     parser.add_argument('--in_file', default="./static_test_data_icl.tsv", type=str)
     parser.add_argument('--out_file', default="./staticData_unilog_prediction_without_warm_up.tsv", type=str)
+    parser.add_argument('--batch_size', default=1, type=int,
+                        help='Prompts per generate call, batches are formed from prompts of similar token length')
+    parser.add_argument('--device', default='auto', choices=['auto', 'cuda', 'cpu'],
+                        help='auto uses the GPU when one is available')
+    parser.add_argument('--num_threads', default=None, type=int, help='torch threads for CPU inference')
+    parser.add_argument('--dtype', default='auto', choices=['auto'] + list(DTYPES),
+                        help='auto is float16 on GPU and float32 on CPU')
+    parser.add_argument('--int8', action='store_true',
+                        help='int8 weights: bitsandbytes on GPU, dynamic quantization of linear layers on CPU')
+    parser.add_argument('--prefix_cache', action='store_true',
+                        help='encode the demonstrations shared by several prompts once and reuse their key/value cache')
+    parser.add_argument('--min_prefix_tokens', default=64, type=int,
+                        help='shortest shared prefix worth caching with --prefix_cache')
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore the checkpoint of an earlier run of the same out_file and start over')
     args = parser.parse_args()
 
     df = pd.read_csv(args.in_file, sep='\t')
@@ -31,53 +255,87 @@ def infer():
         ), axis=1
     )
 
+    device = resolve_device(args.device)
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+
     tokenizer = AutoTokenizer.from_pretrained(args.model_name_or_path)
-    model = AutoModelForCausalLM.from_pretrained(args.model_name_or_path, torch_dtype=torch.float16)
-    model.eval()
+    # Decoder-only models continue from the last position, so batches are padded on the left
+    tokenizer.padding_side = 'left'
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = load_model(args, device)
 
-    print("Load model successfully")
+    print(f"Load model successfully on {device}")
+
+    if not os.path.exists("result_file"):
+        os.mkdir("result_file")
+    checkpoint = PredictionCheckpoint(args.out_file, df.shape[0])
+    if args.restart:
+        checkpoint.remove()
+    finished = checkpoint.load()
+    for i, prediction in finished.items():
+        df.at[i, 'predict'] = prediction
+    if finished:
+        print(f"Resuming from {checkpoint.checkpoint_path}: {len(finished)}/{df.shape[0]} rows already done")
+
+    todo = [i for i in range(df.shape[0]) if i not in finished]
+    prompts = df['retrieved_prompts'].tolist()
+    todo_input_ids = tokenizer([prompts[i] for i in todo]).input_ids
+    all_input_ids = dict(zip(todo, todo_input_ids))
+    num_prompt_tokens, num_new_tokens, num_generated = 0, 0, 0
+
+    if args.prefix_cache:
+        batches = shared_prefix_batches(todo_input_ids, args.min_prefix_tokens, args.batch_size)
+        prefix_cache = PrefixKVCache(model, device)
+    else:
+        batches = [(0, batch) for batch in length_sorted_batches([len(ids) for ids in todo_input_ids], args.batch_size)]
 
     start_time = time.time()  # Start time
 
     with torch.no_grad():
-        for i in tqdm(range(df.shape[0])):
+        for prefix_length, batch in tqdm(batches):
+            batch = [todo[k] for k in batch]
+            batch_prompts = [prompts[i] for i in batch]
+            batch_input_ids = [all_input_ids[i] for i in batch]
             try:
-                prompt = df['retrieved_prompts'][i]
-                input_ids = tokenizer(prompt, return_tensors="pt").input_ids
-                input_ids = input_ids.cuda()
-                pred = model.generate(input_ids, 
-                                      max_new_tokens=256, 
-                                      do_sample=False,
-                                      eos_token_id=2, 
-                                      bos_token_id=1, 
-                                      pad_token_id=tokenizer.pad_token_id)
-                rets = tokenizer.batch_decode(pred, skip_special_tokens=True, clean_up_tokenization_spaces=False)
-                pred = pred.cpu()  # Move predictions back to CPU
-                torch.cuda.empty_cache()  # Clear cache if necessary
-
-                rets_list = ""
-                for j in range(args.num_samples):
-                    rets_list += rets[j].strip().replace(prompt, "")
-                df['predict'][i] = rets_list
+                if prefix_length:
+                    predictions, batch_new_tokens = generate_with_prefix(model, tokenizer, batch_prompts, batch_input_ids,
+                                                                         prefix_cache, prefix_length, device, args.num_samples)
+                else:
+                    predictions, batch_new_tokens = generate_batch(model, tokenizer, batch_prompts, batch_input_ids,
+                                                                   device, args.num_samples)
+                for i, prediction in zip(batch, predictions):
+                    df.at[i, 'predict'] = prediction
+                checkpoint.append(batch, predictions)
+                num_generated += len(batch)
+                num_prompt_tokens += sum(len(ids) for ids in batch_input_ids)
+                num_new_tokens += batch_new_tokens
 
             except RuntimeError as e:
                 if "out of memory" in str(e):
-                    print(f"Out of memory error at index {i}")
-                    print(f"Prompt: {prompt}")
-                    print(f"Token length: {input_ids.size(1)}")
-                    torch.cuda.empty_cache()
+                    print(f"Out of memory error at index {batch}")
+                    print(f"Prompt: {batch_prompts[0]}")
+                    print(f"Token length: {max(len(ids) for ids in batch_input_ids)}")
+                    if device == 'cuda':
+                        torch.cuda.empty_cache()
                 else:
                     raise e
 
     total_time = time.time() - start_time  # Total inference time
-    avg_time = total_time / df.shape[0]  # Average inference time
 
     print(f"Total inference time: {total_time:.2f} seconds")
-    print(f"Average inference time per sample: {avg_time:.2f} seconds")
+    print(f"Throughput: {num_generated / total_time:.2f} samples/s, "
+          f"{num_new_tokens / total_time:.2f} generated tokens/s, "
+          f"{num_prompt_tokens / total_time:.2f} prompt tokens/s")
+    if args.prefix_cache:
+        print(f"Prefix cache: {prefix_cache.reused_tokens}/{num_prompt_tokens} prompt tokens reused, "
+              f"{prefix_cache.computed_tokens} prefix tokens encoded")
 
-    if not os.path.exists("result_file"):
-        os.mkdir("result_file")
     df.to_csv(args.out_file, sep='\t', index=False)
+    # Rows lost to out-of-memory errors are left out of the checkpoint and retried by the next run
+    if checkpoint.rows == df.shape[0]:
+        checkpoint.remove()
 
 if __name__ == '__main__':
     infer()
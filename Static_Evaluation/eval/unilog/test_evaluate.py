@@ -0,0 +1,43 @@
+"""
+Checks of the per-project UniLog evaluation in evaluate.py.
+
+Run with: python -m pytest Static_Evaluation/eval/unilog/test_evaluate.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('tabulate')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from evaluate import evaluate_all_projects, evaluation_greedy
+
+ROWS = [
+    {'metadata': {'statement': 'LOG.info("Loading user " + x);', 'position': '3-4', 'level': 'info', 'vars': ['x']},
+     'response': '<line3> LOG.info("Loading user " + x);'},
+    {'metadata': {'statement': 'log.debug("done" + count);', 'position': '7-8', 'level': 'debug', 'vars': ['count']},
+     'response': '<line9> LOG.warn("finished");'},
+    {'metadata': {'statement': 'log.error(e.getMessage());', 'position': '12-13', 'level': 'error', 'vars': []},
+     'response': 'no statement'},
+]
+
+
+def test_json_and_jsonl_project_files_are_both_evaluated(tmp_path, capsys):
+    with open(tmp_path / 'toola_res.json', 'w', encoding='utf-8') as f:
+        json.dump(ROWS, f)
+    with open(tmp_path / 'toolb_res.jsonl', 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(row) + '\n' for row in ROWS)
+    (tmp_path / 'notes.txt').write_text('not a prediction file')
+
+    metrics, _, _ = evaluation_greedy(str(tmp_path / 'toola_res.json'), 'toola')
+    evaluate_all_projects(str(tmp_path))
+    markdown = capsys.readouterr().out.split('Markdown格式:')[1]
+    rows = [line for line in markdown.splitlines() if line.startswith('| tool')]
+
+    assert sorted(row.split(' | ')[0] for row in rows) == ['| toola', '| toolb']
+    expected = ' | '.join(str(value) for value in list(metrics.values())[1:])
+    assert all(row.split(' | ', 1)[1] == expected + ' |' for row in rows)
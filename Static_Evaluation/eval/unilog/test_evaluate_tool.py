@@ -0,0 +1,43 @@
+"""
+Checks of the columnar UniLog evaluation in evaluate_tool.py.
+
+Run with: python -m pytest Static_Evaluation/eval/unilog/test_evaluate_tool.py
+"""
+
+import os
+import sys
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from evaluate_tool import evaluation_greedy, parse_prediction_column
+
+STATEMENT = 'LOG.info("Loading user " + x);'
+
+
+def write_predictions(path, predictions):
+    rows = [{'statement': STATEMENT, 'position': '3-4', 'level': 'info', 'vars': 'x', 'predict': predict}
+            for predict in predictions]
+    pd.DataFrame(rows).to_csv(path, sep='\t', index=False)
+    return str(path)
+
+
+def test_prediction_without_line_tag_has_no_level_or_message():
+    pred = parse_prediction_column(pd.Series(['<line3> ' + STATEMENT, STATEMENT]))
+    assert list(pred['position'].isna()) == [False, True]
+    assert list(pred['level']) == ['info', '']
+    assert list(pred['message']) == ['"loading user " + x', '']
+
+
+def test_prediction_without_line_tag_is_wrong_on_every_metric(tmp_path):
+    # The untagged prediction is otherwise identical to the ground truth
+    path = write_predictions(tmp_path / 'tool.tsv', ['<line3> ' + STATEMENT, STATEMENT])
+    metrics = evaluation_greedy(path)
+    assert metrics['# of Samples'] == 2
+    assert metrics['Position Accuracy (PA)'] == 50
+    assert metrics['Level Accuracy (LA)'] == 50
+    assert metrics['Message Accuracy (MA)'] == 50
+    assert metrics['Static Text Accuracy BLEU (STA)'] == 50
+    assert metrics['Variables Accuracy (VA)'] == 50